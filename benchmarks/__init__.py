@@ -0,0 +1,11 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Benchmarks of the hot paths of labelled_functions.
+
+Run them with
+
+    python -m benchmarks [--quick] [--max-rows N] [--output results.json]
+
+The results are printed as JSON. Pass a previous output with `--compare` to
+report the benchmarks that became slower.
+"""
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import json
+import platform
+import argparse
+
+import labelled_functions
+
+from . import calls, maps, graph  # Register the benchmarks
+from .runner import Options, run
+
+
+def compare(results, baseline, tolerance):
+    """The cases that are slower than in the baseline by more than `tolerance` (relative)."""
+    previous = {(r['benchmark'], r['case']): r['seconds'] for r in baseline['results']}
+    regressions = []
+    for result in results:
+        key = (result['benchmark'], result['case'])
+        if key in previous and result['seconds'] > previous[key] * (1 + tolerance):
+            regressions.append({'benchmark': key[0], 'case': key[1],
+                                'seconds': result['seconds'], 'baseline': previous[key]})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__)
+    parser.add_argument("--quick", action="store_true", help="fewer cases and repetitions")
+    parser.add_argument("--max-rows", type=int, default=None, help="largest map (default: 10^6, 10^4 with --quick)")
+    parser.add_argument("--max-parallel-rows", type=int, default=10**5, help="largest parallel map")
+    parser.add_argument("--n-jobs", type=int, default=2, help="number of workers of the parallel maps")
+    parser.add_argument("--filter", default=None, help="only run the benchmarks whose name contains this string")
+    parser.add_argument("--output", default=None, help="write the results to this file instead of the standard output")
+    parser.add_argument("--compare", default=None, help="previous output to compare the results with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative slowdown reported as a regression")
+    args = parser.parse_args(argv)
+
+    max_rows = args.max_rows if args.max_rows is not None else (10**4 if args.quick else 10**6)
+    options = Options(quick=args.quick, max_rows=max_rows,
+                      max_parallel_rows=args.max_parallel_rows, n_jobs=args.n_jobs)
+
+    def log(result):
+        print(f"{result['benchmark']:<45} {result['case']:<40} {result['seconds']:.3e} s", file=sys.stderr)
+
+    output = {
+        'labelled_functions': labelled_functions.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'options': vars(args),
+        'results': run(options, name_filter=args.filter, log=log),
+    }
+
+    exit_code = 0
+    if args.compare is not None:
+        with open(args.compare) as f:
+            output['regressions'] = compare(output['results'], json.load(f), args.tolerance)
+        for regression in output['regressions']:
+            print(f"REGRESSION {regression['benchmark']} {regression['case']}: "
+                  f"{regression['baseline']:.3e} s -> {regression['seconds']:.3e} s", file=sys.stderr)
+        exit_code = 1 if len(output['regressions']) > 0 else 0
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+    else:
+        json.dump(output, sys.stdout, indent=2)
+        print()
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Overhead of the calls and of the construction of labelled functions and pipelines."""
+
+from labelled_functions import label, pipeline
+from labelled_functions.labels import LabelledFunction
+
+from .runner import benchmark, measure, time_per_call
+
+
+def add(x, y=1.0):
+    z = x + y
+    return z
+
+
+def increment(z):
+    z = z + 1.0
+    return z
+
+
+@benchmark
+def call_overhead(options):
+    lf = label(add)
+    raw = time_per_call(lambda: add(1.0, y=2.0), options.repeat)
+    yield measure("raw function", raw)
+    for case, call in [
+        ("keywords", lambda: lf(x=1.0, y=2.0)),
+        ("positional", lambda: lf(1.0, 2.0)),
+        ("default value", lambda: lf(x=1.0)),
+    ]:
+        seconds = time_per_call(call, options.repeat)
+        yield measure(f"labelled function, {case}", seconds, overhead=seconds - raw)
+
+
+@benchmark
+def pipeline_call(options):
+    for n_stages in ([1, 10, 100] if options.quick else [1, 10, 100, 1000]):
+        pipe = pipeline([add] + [increment]*(n_stages - 1))
+        pipe(x=1.0)
+        seconds = time_per_call(lambda: pipe(x=1.0), options.repeat)
+        yield measure(f"{n_stages} stages", seconds, per_stage=seconds/n_stages)
+
+
+@benchmark
+def pipeline_construction(options):
+    for n_stages in ([10, 100] if options.quick else [10, 100, 1000]):
+        funcs = [label(add)] + [label(increment)]*(n_stages - 1)
+        def build():
+            pipe = pipeline(funcs)
+            pipe.input_names, pipe.output_names, pipe._plan
+        seconds = time_per_call(build, options.repeat)
+        yield measure(f"{n_stages} stages", seconds, per_stage=seconds/n_stages)
+
+
+@benchmark
+def label_construction(options):
+    label(add)  # The output names of the function are cached after the first call
+    yield measure("label(function)", time_per_call(lambda: LabelledFunction(add), options.repeat))
+    yield measure("label(function, output_names)", time_per_call(lambda: LabelledFunction(add, output_names=['z']), options.repeat))
+    lf = label(add)
+    yield measure("label(labelled function)", time_per_call(lambda: label(lf), options.repeat))
+    yield measure("fix", time_per_call(lambda: lf.fix(y=2.0), options.repeat))
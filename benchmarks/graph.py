@@ -0,0 +1,15 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Construction of the graph of the pipelines."""
+
+from labelled_functions import label, pipeline
+
+from .runner import benchmark, measure, best_time
+
+
+@benchmark
+def graph_construction(options):
+    for n_stages in ([10, 100] if options.quick else [10, 100, 1000]):
+        funcs = [label(lambda x: x + 1, name=f"f{i}", output_names=['x']) for i in range(n_stages)]
+        pipe = pipeline(funcs)
+        yield measure(f"{n_stages} stages", best_time(pipe._graph, options.repeat))
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Throughput and memory of the maps."""
+
+from math import isqrt
+
+from labelled_functions import pipeline, pandas_map, pandas_cartesian_product
+from labelled_functions.decorators import pure
+
+from .runner import benchmark, measure, best_time, peak_memory
+
+
+def square(x):
+    x2 = x*x
+    return x2
+
+
+def scale(y):
+    factor = 2.0*y
+    return factor
+
+
+def product(x2, factor):
+    p = x2*factor
+    return p
+
+
+def _cases(options):
+    """(number of rows, n_jobs) of the cases."""
+    for n_rows in options.sizes(options.max_rows):
+        yield n_rows, 1
+    if options.n_jobs > 1:
+        for n_rows in options.sizes(min(options.max_rows, options.max_parallel_rows)):
+            yield n_rows, options.n_jobs
+
+
+def _measure_map(case, n_rows, n_jobs, run, options):
+    repeat = 1 if n_rows >= 10**5 else options.repeat
+    seconds = best_time(run, repeat)
+    memory = peak_memory(run) if n_jobs == 1 else None
+    return measure(case, seconds, rows=n_rows, n_jobs=n_jobs,
+                   rows_per_second=n_rows/seconds, peak_memory=memory)
+
+
+@benchmark
+def pandas_map_throughput(options):
+    for n_rows, n_jobs in _cases(options):
+        xs = [float(i) for i in range(n_rows)]
+        yield _measure_map(f"{n_rows} rows, n_jobs={n_jobs}", n_rows, n_jobs,
+                           lambda: pandas_map(square, x=xs, n_jobs=n_jobs), options)
+
+
+@benchmark
+def pandas_cartesian_product_throughput(options):
+    pipe = pipeline([pure(square), pure(scale), product])  # The pure functions are hoisted
+    for n_rows, n_jobs in _cases(options):
+        side = isqrt(n_rows)
+        xs, ys = [float(i) for i in range(side)], [float(i) for i in range(side)]
+        yield _measure_map(f"{side}x{side} pipeline, n_jobs={n_jobs}", side*side, n_jobs,
+                           lambda: pandas_cartesian_product(pipe, x=xs, y=ys, n_jobs=n_jobs), options)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Registry of the benchmarks and timing tools."""
+
+import gc
+import tracemalloc
+from time import perf_counter
+
+
+_benchmarks = []  # (name, function)
+
+
+def benchmark(function):
+    """Register a benchmark. The function receives the `Options` of the run
+    and yields the results of its cases (see `measure`)."""
+    _benchmarks.append((f"{function.__module__.rsplit('.', 1)[-1]}.{function.__name__}", function))
+    return function
+
+
+class Options:
+    def __init__(self, quick=False, max_rows=10**6, max_parallel_rows=10**5, n_jobs=2):
+        self.quick = quick
+        self.max_rows = max_rows
+        self.max_parallel_rows = max_parallel_rows
+        self.n_jobs = n_jobs
+
+    @property
+    def repeat(self):
+        return 3 if self.quick else 7
+
+    def sizes(self, max_size):
+        """Powers of ten from 10^3 up to `max_size`."""
+        sizes, n = [], 10**3
+        while n <= max_size:
+            sizes.append(n)
+            n *= 10
+        return sizes
+
+
+def time_per_call(function, repeat, min_duration=0.05):
+    """Best time of a call of `function()` over `repeat` runs of a loop of
+    calls lasting at least `min_duration` seconds."""
+    number = 1
+    while True:
+        duration = _loop(function, number)
+        if duration >= min_duration:
+            break
+        number *= 10
+    return min([duration] + [_loop(function, number) for _ in range(repeat - 1)]) / number
+
+
+def _loop(function, number):
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = perf_counter()
+        for _ in range(number):
+            function()
+        return perf_counter() - start
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def best_time(function, repeat):
+    """Best duration of `function()` over `repeat` runs."""
+    durations = []
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        durations.append(perf_counter() - start)
+    return min(durations)
+
+
+def peak_memory(function):
+    """Peak memory (in bytes) allocated by `function()`, traced with `tracemalloc`."""
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        start = tracemalloc.get_traced_memory()[0]
+        function()
+        return tracemalloc.get_traced_memory()[1] - start
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+
+def measure(case, seconds, **extra):
+    """The result of a case of a benchmark."""
+    return {'case': case, 'seconds': seconds, **extra}
+
+
+def run(options, name_filter=None, log=None):
+    results = []
+    for name, function in _benchmarks:
+        if name_filter is not None and name_filter not in name:
+            continue
+        for result in function(options):
+            result = {'benchmark': name, **result}
+            if log is not None:
+                log(result)
+            results.append(result)
+    return results
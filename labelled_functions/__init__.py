@@ -6,5 +6,6 @@ from .__about__ import (
 from .labels import label
 from .pipeline import pipeline, compose
 from .special_functions import let, show, relabel
-from .maps import pandas_map, pandas_cartesian_product, full_parametric_study
+from .maps import pandas_map, pandas_cartesian_product, full_parametric_study, xarray_apply
 from .decorators import time
+from .profiling import profile
@@ -1,17 +1,57 @@
 #!/usr/bin/env python
 # coding: utf-8
 
-from typing import Callable, Set, List, Dict, Union, Any
+import sys
+from typing import Callable, List, Dict, Union, Any, TYPE_CHECKING
 from copy import copy
 from abc import ABC, abstractmethod
+from functools import partial
+from inspect import Parameter, signature
+from keyword import iskeyword
 
-import xarray as xr
+if TYPE_CHECKING:
+    import xarray as xr
 
-Unknown = object()
+class _UnknownType:
+    """Type of the `Unknown` placeholder for the output names that have not been determined yet."""
+    __slots__ = ()
+
+    def __repr__(self):
+        return "Unknown"
+
+    def __reduce__(self):
+        return "Unknown"  # Pickled by reference, such that `is Unknown` holds after unpickling.
+
+Unknown = _UnknownType()
+_MISSING = object()  # Default value of the arguments in the functions generated by `_compile_call`
+
+def _is_instance(obj, module_name, class_name):
+    """Same as `isinstance(obj, module.class)`, without importing the module
+    if it has not been imported yet (then obj can't be an instance of the class)."""
+    module = sys.modules.get(module_name)
+    return module is not None and isinstance(obj, getattr(module, class_name))
+
+class _FunctionDocstring:
+    """Descriptor for the `__doc__` of a labelled function class: the docstring
+    of the class itself, or the docstring of the wrapped function on instances."""
+
+    def __init__(self, class_docstring):
+        self.class_docstring = class_docstring
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self.class_docstring
+        return getattr(obj.function, '__doc__', None)
+
+def _is_valid_name(name):
+    return isinstance(name, str) and name.isidentifier() and not iskeyword(name) and not name.startswith("__lf_")
 
 class AbstractLabelledCallable(ABC):
     """Common code between all labelled function classes."""
 
+    __slots__ = ('function', 'name', 'input_names', 'output_names', 'default_values',
+                 'vectorized', 'pure', '_has_never_been_run', '_call', '__weakref__')
+
     def __init__(self,
                  function: Callable,
                  name: str,
@@ -20,17 +60,31 @@ class AbstractLabelledCallable(ABC):
                  default_values: Dict[str, Any],
                  ):
 
+        self._call = None
         self.function = function
         self.name = name
-        self.__name__ = name
         self.input_names = input_names
         self.output_names = output_names
 
         self.default_values = default_values
         assert set(self.default_values.keys()) <= set(self.input_names)
 
+        # Whether the function can be called with arrays of inputs to compute
+        # several outputs at once (see `decorators.vectorized`).
+        self.vectorized = False
+        # Whether the function has no side effects, such that it can be
+        # evaluated when a pipeline is built (see `decorators.pure`).
+        self.pure = False
         self._has_never_been_run = True
 
+    @property
+    def __name__(self):
+        return self.name
+
+    @property
+    def __wrapped__(self):
+        return self.function
+
     # SETTING ATTRIBUTES
     def rename(self, name):
         f = copy(self)
@@ -62,8 +116,29 @@ class AbstractLabelledCallable(ABC):
         return self.hide(*set(self.input_names) - set(not_hidden_names))
 
 
+    # FINGERPRINT
+
+    def fingerprint(self) -> str:
+        """Deterministic digest of the computation done by this function (see
+        `hashing.fingerprint`), that does not depend on its name."""
+        from labelled_functions.hashing import fingerprint
+        return fingerprint(self)
+
+    @abstractmethod
+    def _fingerprint_data(self):
+        """The objects to hash to compute the fingerprint."""
+        pass
+
     # CALLS
 
+    # Changing these attributes requires a new call function (see `_compile_call`).
+    _call_attributes = frozenset({'function', 'input_names', 'default_values', 'output_names', '_has_never_been_run'})
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        if name in self._call_attributes:
+            super().__setattr__('_call', None)
+
     def _preprocess_inputs(self, args, kwargs):
         passed_as_positional = self.input_names[:len(args)]
 
@@ -118,11 +193,103 @@ class AbstractLabelledCallable(ABC):
         return result
 
     def __call__(self, *args, **kwargs):
+        call = self._call
+        if call is None:
+            call = self._call = self._compile_call()
+        return call(*args, **kwargs)
+
+    def _generic_call(self, *args, **kwargs):
         args, kwargs = self._preprocess_inputs(args, kwargs)
         result = self.function(*args, **kwargs)
         return self._postprocess_outputs(result)
 
-    def apply_in_namespace(self, namespace: Union[Dict[str, Any], xr.Dataset]) -> Union[Dict[str, Any], xr.Dataset]:
+    def _compile_call(self):
+        """Generate a function binding and checking the arguments for this
+        specific set of input names and default values, as if the function
+        had been written by hand:
+
+            def call(x=MISSING, y=MISSING, *extra_args, z=MISSING, **extra_kwargs):
+                if extra_args or extra_kwargs:
+                    raise TypeError(...)
+                if x is MISSING:
+                    x = default_values.get('x', MISSING)
+                    if x is MISSING:
+                        raise TypeError(...)
+                ...
+                return function(x=x, y=y, z=z, w=fixed_w_value)
+
+        The values fixed by `fix` are passed directly to the underlying function
+        instead of going through `functools.partial`. The default values are
+        read when the call is made, such that editing `default_values` in place
+        is taken into account.
+        The outputs are only checked by the function used for the first call.
+
+        Falls back to `_generic_call` when the arguments cannot be passed by
+        keywords to the function.
+        """
+        function, fixed = self.function, {}
+        if isinstance(function, partial) and len(function.args) == 0:
+            function, fixed = function.func, function.keywords
+
+        names = list(self.input_names)
+        if not all(_is_valid_name(name) for name in [*names, *fixed]):
+            return self._generic_call
+
+        try:
+            parameters = [p for p in signature(self.function).parameters.values() if p.name not in fixed]
+        except (ValueError, TypeError):
+            return self._generic_call
+
+        if [p.name for p in parameters] == names and all(p.kind in (Parameter.POSITIONAL_OR_KEYWORD, Parameter.KEYWORD_ONLY) for p in parameters):
+            keyword_only = {p.name for p in parameters if p.kind == Parameter.KEYWORD_ONLY}
+        elif len(parameters) == 1 and parameters[0].kind == Parameter.VAR_KEYWORD:
+            keyword_only = set(names)  # e.g. the function of a pipeline
+        else:
+            return self._generic_call
+
+        namespace = {'__lf_self': self, '__lf_function': function, '__lf_MISSING': _MISSING,
+                     '__lf_defaults': self.default_values}
+        parameters = [
+            *(f"{name}=__lf_MISSING" for name in names if name not in keyword_only),
+            "*__lf_args",
+            *(f"{name}=__lf_MISSING" for name in names if name in keyword_only),
+            "**__lf_kwargs",
+        ]
+        lines = [
+            f"def __lf_call({', '.join(parameters)}):",
+            "    if __lf_args or __lf_kwargs:",
+            "        __lf_self._raise_superfluous(__lf_args, __lf_kwargs)",
+        ]
+
+        for name in names:
+            lines.append(f"    if {name} is __lf_MISSING:")
+            lines.append(f"        {name} = __lf_defaults.get({name!r}, __lf_MISSING)")
+            lines.append(f"        if {name} is __lf_MISSING:")
+            lines.append("            __lf_self._raise_missing(locals())")
+
+        arguments = [f"{name}={name}" for name in names]
+        for i, (name, value) in enumerate(fixed.items()):
+            namespace[f"__lf_fixed_{i}"] = value
+            arguments.append(f"{name}=__lf_fixed_{i}")
+        call = f"__lf_function({', '.join(arguments)})"
+        if self._has_never_been_run:
+            call = f"__lf_self._postprocess_outputs({call})"
+        lines.append(f"    return {call}")
+
+        exec("\n".join(lines), namespace)
+        return namespace['__lf_call']
+
+    def _raise_missing(self, arguments):
+        missing_inputs = {name for name in self.input_names
+                          if arguments.get(name) is _MISSING and name not in self.default_values}
+        raise TypeError(f"{self.__class__.__name__} {self.name} is missing argument(s): {missing_inputs}")
+
+    def _raise_superfluous(self, args, kwargs):
+        if len(args) > 0:
+            raise TypeError(f"{self.__class__.__name__} {self.name} got too many positional arguments")
+        raise TypeError(f"{self.__class__.__name__} {self.name} got unexpected argument(s): {set(kwargs.keys())}")
+
+    def apply_in_namespace(self, namespace: Union[Dict[str, Any], "xr.Dataset"]) -> Union[Dict[str, Any], "xr.Dataset"]:
         """Call the functions using the relevant variables in the namespace as
         inputs and adding the outputs to the namespace (in-place).
 
@@ -131,7 +298,7 @@ class AbstractLabelledCallable(ABC):
         >>> LabelledFunction(round).apply_in_namespace({'number': 4.2, 'other': 'a'})
         {'number': 4.2, 'other': 'a', 'round': 4}
         """
-        if isinstance(namespace, xr.Dataset):
+        if _is_instance(namespace, "xarray", "Dataset"):
             keys = set(namespace.coords) | set(namespace.data_vars)
         else:
             keys = namespace.keys()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Adaptive parametric studies, refining the grid where the outputs change.
+
+>>> adaptive_cartesian_product(f, x=np.linspace(0, 1, 5), y=np.linspace(0, 1, 5), tolerance=0.1)
+
+The study starts with the cartesian product of the given values of the
+inputs (evaluated with `pandas_cartesian_product`). The grid is then made of
+cells, whose corners are neighbouring points of the product. At each
+iteration, the cells on which the variation of an output (the difference
+between its largest and smallest values at the corners of the cell) exceeds
+the tolerance are split in two along each input, and the new points are
+evaluated in a single parallel batch.
+"""
+
+from itertools import product
+
+from .labels import label
+from .maps import pandas_cartesian_product, pandas_map, _preprocess_map_inputs
+
+
+# API
+
+def adaptive_cartesian_product(f, *args, tolerance, outputs=None, max_iterations=5, max_evaluations=None,
+                               progress_bar=False, progress=None, n_jobs=1, **kwargs):
+    """Apply the labelled function to a grid of the inputs refined where the
+    outputs vary by more than the tolerance, and return the inputs and
+    outputs as a dataframe (as `pandas_cartesian_product`).
+
+    Parameters
+    ----------
+    f: labelled function or pipeline
+    args, kwargs:
+        The values of the inputs on the initial coarse grid, as for
+        `pandas_cartesian_product`. The inputs must be numbers. The inputs
+        with a single value are not refined.
+    tolerance: float or Dict[str, float]
+        Largest variation of the outputs on a cell not to refine it, for all
+        the outputs or for each output.
+    outputs: List[str], optional
+        The outputs whose variation is checked. By default, the outputs in
+        `tolerance` if it is a dict, else all the outputs.
+    max_iterations: int, optional
+        Maximum number of refinements of the grid.
+    max_evaluations: int, optional
+        Maximum number of new points evaluated during the refinements. When
+        the budget is short, the cells with the largest variations are
+        refined first.
+    progress_bar, progress, n_jobs:
+        As for `pandas_map`, for each batch of evaluations.
+    """
+    import numpy as np
+    import pandas as pd
+    f = label(f)
+    grid = {name: sorted(set(values)) for name, values in _preprocess_map_inputs(f.input_names, args, kwargs).items()}
+    names = list(grid.keys())
+    if outputs is None:
+        outputs = list(tolerance.keys()) if isinstance(tolerance, dict) else list(f.output_names)
+    tolerances = np.array([tolerance[name] if isinstance(tolerance, dict) else tolerance for name in outputs], dtype=float)
+
+    results = [pandas_cartesian_product(f, **grid, progress_bar=progress_bar, progress=progress, n_jobs=n_jobs)]
+    values = _values_of_outputs(results[-1], names, outputs)
+    cells = list(product(*(_intervals(grid[name]) for name in names)))
+    n_evaluations = 0
+
+    for _ in range(max_iterations):
+        variations = [(_variation(cell, values) / tolerances).max() for cell in cells]
+        to_refine = [cell for variation, cell in sorted(zip(variations, cells), key=lambda vc: -vc[0]) if variation > 1.0]
+
+        new_points, refined = {}, []
+        for cell in to_refine:
+            cell_points = [point for point in product(*(_with_middle(interval) for interval in cell))
+                           if point not in values and point not in new_points]
+            if max_evaluations is not None and n_evaluations + len(new_points) + len(cell_points) > max_evaluations:
+                break
+            new_points.update(dict.fromkeys(cell_points))
+            refined.append(cell)
+        if len(new_points) == 0:
+            break
+
+        columns = {name: [point[i] for point in new_points] for i, name in enumerate(names)}
+        results.append(pandas_map(f, **columns, progress_bar=progress_bar, progress=progress, n_jobs=n_jobs))
+        values.update(_values_of_outputs(results[-1], names, outputs))
+        n_evaluations += len(new_points)
+
+        refined = set(refined)
+        cells = [child for cell in cells
+                 for child in (product(*(_halves(interval) for interval in cell)) if cell in refined else [cell])]
+
+    return pd.concat(results).sort_index()
+
+
+# INTERNALS
+
+def _intervals(values):
+    """Intervals between successive values (a single interval of zero width for a single value)."""
+    if len(values) == 1:
+        return [(values[0], values[0])]
+    return list(zip(values[:-1], values[1:]))
+
+
+def _with_middle(interval):
+    low, high = interval
+    return (low,) if low == high else (low, (low + high) / 2, high)
+
+
+def _halves(interval):
+    low, high = interval
+    if low == high:
+        return [interval]
+    middle = (low + high) / 2
+    return [(low, middle), (middle, high)]
+
+
+def _variation(cell, values):
+    """Difference between the largest and the smallest values of the outputs at the corners of the cell."""
+    import warnings
+    import numpy as np
+    corners = np.array([values[corner] for corner in product(*cell)])
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # Outputs that are NaN on all the corners
+        return np.nan_to_num(np.nanmax(corners, axis=0) - np.nanmin(corners, axis=0)) if len(corners) > 0 else 0.0
+
+
+def _values_of_outputs(data, names, outputs):
+    """Dict mapping the values of the inputs of each row of the dataframe to the values of the outputs."""
+    data = data.reset_index()
+    points = zip(*(data[name].tolist() for name in names))
+    return dict(zip(points, data[outputs].to_numpy(dtype=float)))
@@ -50,6 +50,25 @@ def time(func):
     return timed_func
 
 
+def vectorized(func):
+    """Mark the function as able to process whole arrays of inputs at once,
+    such that it is called only once per map in columnar mode (see
+    `maps.pandas_map`)."""
+    new_func = copy(label(func))
+    new_func.vectorized = True
+    return new_func
+
+
+def pure(func):
+    """Mark the function as free of side effects, such that in a pipeline, it
+    can be evaluated once when the pipeline is built if all its inputs are
+    known at that time (e.g. outputs of `let` or fixed values), and in a
+    cartesian product, once for each combination of the inputs it depends on."""
+    new_func = copy(label(func))
+    new_func.pure = True
+    return new_func
+
+
 def with_progress_bar(lab_f, total=None):
     """Add a tqdm object to count calls and display a progress bar."""
     from tqdm import tqdm
@@ -63,8 +82,8 @@ def with_progress_bar(lab_f, total=None):
         return exec_with_call_counter
 
     new_lab_f = copy(lab_f)
-    new_lab_f.bar = bar
     new_lab_f.function = add_call_counter(lab_f.function)
+    new_lab_f.bar = bar
 
     return new_lab_f
 
@@ -81,3 +100,28 @@ def cache(func, memory=None):
         memory = Memory("/tmp", verbose=0)
     return decorate(func, memory.cache)
 
+
+def memoize(func, memoizer=None, **memoizer_options):
+    """Cache the results of the labelled function in a `memoization.Memoizer`.
+
+    The keys of the cache are built from the fingerprint of the function (see
+    `hashing.fingerprint`) and from the names and values of its inputs, such
+    that functions sharing a memoizer can not be mixed up. Calls with inputs
+    that can not be hashed are not cached.
+
+    Parameters
+    ----------
+    func: labelled function or pipeline
+    memoizer: Memoizer, optional
+        An existing cache, e.g. to share it between several functions.
+    memoizer_options:
+        Passed to the constructor of the `Memoizer` when none is given
+        (`max_entries`, `max_bytes`, `directory`, `max_disk_bytes`).
+
+    The memoizer and its statistics can be accessed as `f.function.cache`.
+    """
+    from labelled_functions.memoization import Memoizer
+    func = label(func)
+    if memoizer is None:
+        memoizer = Memoizer(**memoizer_options)
+    return decorate(func, lambda f: memoizer.wrap(f, func.fingerprint(), func.input_names))
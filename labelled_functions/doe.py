@@ -1,15 +1,537 @@
 #!/usr/bin/env python
 # coding: utf-8
+"""Design of experiments: plans of experiments to run with the maps.
 
-from itertools import product
+A plan is a sequence of experiments, each experiment being a dict of input
+values. The plans built by the functions of this module know their length
+and compute their i-th experiment directly, such that they can be split into
+shards run by separate jobs:
+
+>>> plan = product_of_plans(a=range(1000), b=range(1000))
+>>> len(plan)
+1000000
+>>> plan[123456]
+{'a': 123, 'b': 456}
+>>> shard = plan.shard(3, 10)  # Fourth tenth of the plan
+
+The inputs given as iterators (e.g. generators or `itertools.count()`) are
+only read when their experiments are needed, such that they can be zipped
+with finite sequences or iterated lazily:
+
+>>> plan = zip_plans(i=itertools.count(), x=[0.1, 0.2])
+>>> len(plan)
+2
+
+A plan can also be materialized at once as columns of NumPy arrays (without
+building a dict per experiment) and passed directly to the maps:
+
+>>> plan = product_of_plans(latin_hypercube(100, x=(0.0, 1.0), y=(-1.0, 1.0)), z=[1, 2, 3])
+>>> plan.to_columns()  # {'x': array([...]), 'y': array([...]), 'z': array([...])}
+>>> pandas_map(f, plan)
+"""
+
+from abc import abstractmethod
+from bisect import bisect_right
+from collections import abc
 from copy import copy
-from typing import Union, Sequence, Dict
+from typing import Sequence, Dict
+
+from .abstract import _is_instance
+
+
+# PLANS
+
+class Plan(abc.Sequence):
+    """Abstract base class of the sized, random-access plans of experiments.
+    The subclasses must define `__len__` and `_experiment`."""
+
+    # Whether the length of the plan is only known after reading all the values
+    # of an iterator (that may be infinite, see `_LazyList`).
+    _is_lazy = False
+
+    @abstractmethod
+    def _experiment(self, i) -> Dict:
+        """The i-th experiment, for 0 <= i < len(self)."""
+        pass
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return SubPlan(self, range(len(self))[i])
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < self._length_up_to(i + 1):
+            raise IndexError(f"Experiment {i} is out of a plan of length {len(self)}")
+        return self._experiment(i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._experiment(i)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} of {len(self)} experiments>"
+
+    def _length_up_to(self, n) -> int:
+        """min(len(self), n), without reading the values of the iterators
+        beyond the n-th ones."""
+        return min(len(self), n)
+
+    def _take(self, indices) -> Dict:
+        """The columns of the experiments at the given indices (a NumPy
+        array of integers in [0, len(self)))."""
+        experiments = [self._experiment(int(i)) for i in indices]
+        names = dict.fromkeys(name for experiment in experiments for name in experiment)
+        return {name: _as_column([experiment.get(name, float('nan')) for experiment in experiments])
+                for name in names}
+
+    def to_columns(self) -> Dict:
+        """The experiments as a dict of columns (NumPy arrays)."""
+        import numpy as np
+        return self._take(np.arange(len(self)))
+
+    def to_dataframe(self):
+        """The experiments as a dataframe, with a column per input."""
+        import pandas as pd
+        return pd.DataFrame(self.to_columns())
+
+    def shard(self, k, n):
+        """The k-th of n contiguous parts of the plan (for 0 <= k < n), of
+        lengths differing by at most one."""
+        if not 0 <= k < n:
+            raise ValueError(f"Invalid shard {k} of {n}")
+        length = len(self)
+        return SubPlan(self, range(k * length // n, (k + 1) * length // n))
+
+
+class SequencePlan(Plan):
+    """The values of a single input."""
+
+    def __init__(self, name, values):
+        self.name = name
+        if isinstance(values, (range, list, tuple)) or _is_instance(values, "numpy", "ndarray"):
+            self.values = values
+        elif isinstance(values, abc.Sized):
+            self.values = list(values)
+        else:
+            self.values = _LazyList(values)
+        self._is_lazy = isinstance(self.values, _LazyList)
+        self._column = None
+
+    def __len__(self):
+        return len(self.values)
+
+    def _length_up_to(self, n):
+        if self._is_lazy:
+            return self.values._length_up_to(n)
+        return min(len(self), n)
+
+    def __iter__(self):
+        for value in self.values:
+            yield {self.name: value}
+
+    def _experiment(self, i):
+        return {self.name: self.values[i]}
+
+    def _take(self, indices):
+        if self._is_lazy:
+            return {self.name: _as_column([self.values[int(i)] for i in indices])}
+        if self._column is None:
+            self._column = _as_column(self.values)
+        return {self.name: self._column[indices]}
+
+
+class ArrayPlan(Plan):
+    """A plan given as columns of values of the same length, e.g. the points
+    of a space-filling design."""
+
+    def __init__(self, **columns):
+        self.columns = {name: _as_column(values) for name, values in columns.items()}
+        lengths = {len(column) for column in self.columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f"The columns of the plan have different lengths: {sorted(lengths)}")
+        self._length = lengths.pop() if len(lengths) > 0 else 0
+
+    def __len__(self):
+        return self._length
+
+    def _experiment(self, i):
+        return {name: column[i] for name, column in self.columns.items()}
+
+    def _take(self, indices):
+        return {name: column[indices] for name, column in self.columns.items()}
+
+
+class ListPlan(Plan):
+    """A plan given as a list of experiments."""
+
+    def __init__(self, experiments):
+        if isinstance(experiments, abc.Sized):
+            self.experiments = list(experiments)
+        else:
+            self.experiments = _LazyList(experiments)
+        self._is_lazy = isinstance(self.experiments, _LazyList)
+
+    def __len__(self):
+        return len(self.experiments)
+
+    def _length_up_to(self, n):
+        if self._is_lazy:
+            return self.experiments._length_up_to(n)
+        return min(len(self), n)
+
+    def __iter__(self):
+        for experiment in self.experiments:
+            yield copy(experiment)
+
+    def _experiment(self, i):
+        return copy(self.experiments[i])
+
+
+class _LazyList:
+    """The values of an iterator, read when they are first needed. Only
+    `len` reads all of them."""
+
+    def __init__(self, iterable):
+        self._iterator = iter(iterable)
+        self._values = []
+
+    def _length_up_to(self, n):
+        """Read the values until there are n of them (or none left)."""
+        while self._iterator is not None and len(self._values) < n:
+            try:
+                self._values.append(next(self._iterator))
+            except StopIteration:
+                self._iterator = None
+        return min(len(self._values), n)
+
+    def __len__(self):
+        while self._iterator is not None:
+            self._length_up_to(len(self._values) + 1)
+        return len(self._values)
+
+    def __getitem__(self, i):
+        if i >= 0:
+            self._length_up_to(i + 1)
+            return self._values[i]
+        return self._values[len(self) + i]
+
+    def __iter__(self):
+        i = 0
+        while self._length_up_to(i + 1) > i:
+            yield self._values[i]
+            i += 1
+
+
+class ConcatenatedPlan(Plan):
+    """The experiments of several plans, one plan after the other."""
+
+    def __init__(self, plans):
+        self.plans = [as_plan(plan) for plan in plans]
+        self._is_lazy = any(plan._is_lazy for plan in self.plans)
+        self._cumulated_lengths = None
+
+    @property
+    def _offsets(self):
+        """Index of the first experiment of each plan, and length of the plan."""
+        if self._cumulated_lengths is None:
+            offsets = [0]
+            for plan in self.plans:
+                offsets.append(offsets[-1] + len(plan))
+            self._cumulated_lengths = offsets
+        return self._cumulated_lengths
+
+    def __len__(self):
+        return self._offsets[-1]
+
+    def _length_up_to(self, n):
+        length = 0
+        for plan in self.plans:
+            if length >= n:
+                break
+            length += plan._length_up_to(n - length)
+        return min(length, n)
+
+    def __iter__(self):
+        for plan in self.plans:
+            yield from plan
+
+    def _experiment(self, i):
+        j = bisect_right(self._offsets, i) - 1
+        return self.plans[j]._experiment(i - self._offsets[j])
 
-import pandas as pd
+    def _take(self, indices):
+        import numpy as np
+        which = np.searchsorted(self._offsets, indices, side='right') - 1
+        parts = []
+        for j, plan in enumerate(self.plans):
+            mask = which == j
+            if mask.any():
+                parts.append((mask, plan._take(indices[mask] - self._offsets[j])))
+        names = dict.fromkeys(name for _, columns in parts for name in columns)
+        merged = {}
+        for name in names:
+            if all(name in columns for _, columns in parts):
+                column = np.empty(len(indices), dtype=np.result_type(*(columns[name].dtype for _, columns in parts)))
+            else:  # Missing values, as in a dataframe built from the experiments
+                column = np.full(len(indices), float('nan'), dtype=object)
+            for mask, columns in parts:
+                if name in columns:
+                    column[mask] = columns[name]
+            merged[name] = column
+        return merged
 
-def from_sequence(**kwargs):
-    for name, values in kwargs.items():
-        yield from ({name: val} for val in values)
+
+class ZippedPlan(Plan):
+    """The i-th experiment merges the i-th experiments of the plans. The
+    length is the length of the shortest plan, as for `zip`."""
+
+    def __init__(self, plans):
+        self.plans = [as_plan(plan) for plan in plans]
+        self._is_lazy = all(plan._is_lazy for plan in self.plans) and len(self.plans) > 0
+        self._length = None
+
+    def __len__(self):
+        if self._length is None:
+            # The plans built from iterators are only read up to the length of the others.
+            length = min((len(plan) for plan in self.plans if not plan._is_lazy), default=None)
+            for plan in self.plans:
+                if plan._is_lazy:
+                    length = len(plan) if length is None else plan._length_up_to(length)
+            self._length = length if length is not None else 0
+        return self._length
+
+    def _length_up_to(self, n):
+        return min((plan._length_up_to(n) for plan in self.plans), default=0)
+
+    def __iter__(self):
+        for experiments in zip(*self.plans):
+            yield merge_dicts(experiments)
+
+    def _experiment(self, i):
+        return merge_dicts(plan._experiment(i) for plan in self.plans)
+
+    def _take(self, indices):
+        return merge_dicts(plan._take(indices) for plan in self.plans)
+
+
+class ProductPlan(Plan):
+    """All the combinations of the experiments of the plans, in the order of
+    `itertools.product` (the last plan varies the fastest)."""
+
+    def __init__(self, plans):
+        self.plans = [as_plan(plan) for plan in plans]
+        self._lengths = [len(plan) for plan in self.plans]
+
+    def __len__(self):
+        length = 1 if len(self.plans) > 0 else 0
+        for n in self._lengths:
+            length *= n
+        return length
+
+    def _experiment(self, i):
+        indices = []
+        for n in reversed(self._lengths):
+            i, j = divmod(i, n)
+            indices.append(j)
+        return merge_dicts(plan._experiment(j) for plan, j in zip(self.plans, reversed(indices)))
+
+    def _take(self, indices):
+        import numpy as np
+        if len(self.plans) == 0:
+            return {}
+        indices_of_plans = []
+        for n in reversed(self._lengths):
+            indices, j = np.divmod(indices, n)
+            indices_of_plans.append(j)
+        return merge_dicts(plan._take(j) for plan, j in zip(self.plans, reversed(indices_of_plans)))
+
+
+class CrossPlan(Plan):
+    """The pivot, followed by the experiments of the plans applied to the
+    pivot one plan after the other (skipping the ones equal to the pivot)."""
+
+    def __init__(self, plans, pivot):
+        self.pivot = pivot
+        self.plans = [as_plan(plan) for plan in plans]
+        self._kept = [None for _ in self.plans]
+
+    def _differs_from_pivot(self, experiment):
+        return {**self.pivot, **experiment} != self.pivot
+
+    def _kept_of(self, j):
+        """Indices of the experiments of the j-th plan that differ from the
+        pivot, computed when they are first needed."""
+        if self._kept[j] is None:
+            self._kept[j] = [i for i, experiment in enumerate(self.plans[j])
+                             if self._differs_from_pivot(experiment)]
+        return self._kept[j]
+
+    def __len__(self):
+        return 1 + sum(len(self._kept_of(j)) for j in range(len(self.plans)))
+
+    def _length_up_to(self, n):
+        length = 1
+        for j in range(len(self.plans)):
+            if length >= n:
+                break
+            length += len(self._kept_of(j))
+        return min(length, n)
+
+    def __iter__(self):
+        yield copy(self.pivot)
+        for plan in self.plans:
+            for experiment in plan:
+                if self._differs_from_pivot(experiment):
+                    yield {**self.pivot, **experiment}
+
+    def _experiment(self, i):
+        if i == 0:
+            return copy(self.pivot)
+        k = i - 1
+        for j, plan in enumerate(self.plans):
+            kept = self._kept_of(j)
+            if k < len(kept):
+                return {**self.pivot, **plan._experiment(kept[k])}
+            k -= len(kept)
+        raise IndexError(f"Experiment {i} is out of the plan")
+
+
+class SubPlan(Plan):
+    """A view on some of the experiments of a plan (e.g. a shard)."""
+
+    def __init__(self, plan, indices: range):
+        self.plan = plan
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def _experiment(self, i):
+        return self.plan._experiment(self.indices[i])
+
+    def _take(self, indices):
+        import numpy as np
+        return self.plan._take(np.arange(self.indices.start, self.indices.stop, self.indices.step)[indices])
+
+
+def as_plan(experiments) -> Plan:
+    """Turn an iterable of experiments into a plan (if it is not one already)."""
+    if isinstance(experiments, Plan):
+        return experiments
+    return ListPlan(experiments)
+
+
+def _as_column(values):
+    """The values as a one-dimensional NumPy array. Strings and other objects
+    (e.g. tuples) are kept as they are in an array of objects."""
+    import numpy as np
+    if isinstance(values, np.ndarray) and values.ndim == 1:
+        return values
+    if isinstance(values, range):
+        return np.arange(values.start, values.stop, values.step)
+    values = list(values)
+    column = np.asarray(values) if len(values) > 0 else np.empty(0, dtype=object)
+    if column.ndim != 1 or column.dtype.kind in 'USO':
+        column = np.empty(len(values), dtype=object)
+        for i, value in enumerate(values):
+            column[i] = value
+    return column
+
+
+# SPACE-FILLING DESIGNS
+
+def latin_hypercube(n, seed=None, **bounds) -> ArrayPlan:
+    """Latin hypercube sample of `n` points: the range of each input is split
+    into `n` intervals of the same width, each containing exactly one point.
+
+    Parameters
+    ----------
+    n: int
+        Number of experiments.
+    seed: int or np.random.Generator, optional
+    bounds: Tuple[float, float]
+        The lower and upper bounds of each input, e.g. `x=(0.0, 1.0)`.
+    """
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    permutations = np.argsort(rng.random((len(bounds), n)), axis=1)
+    unit = (permutations + rng.random((len(bounds), n))) / n
+    return _scaled(unit, bounds)
+
+
+def halton(n, skip=0, **bounds) -> ArrayPlan:
+    """First `n` points of the Halton low-discrepancy sequence (after the
+    first `skip` ones), using the successive prime numbers as bases.
+
+    Parameters
+    ----------
+    n: int
+        Number of experiments.
+    skip: int, optional
+        Number of points of the sequence to skip, e.g. to extend a previous
+        design with new points.
+    bounds: Tuple[float, float]
+        The lower and upper bounds of each input, e.g. `x=(0.0, 1.0)`.
+    """
+    import numpy as np
+    indices = np.arange(skip + 1, skip + n + 1)  # The point 0 of the sequence is skipped, as usual.
+    unit = np.stack([_radical_inverse(indices, base) for base in _primes(len(bounds))]) if len(bounds) > 0 else np.empty((0, n))
+    return _scaled(unit, bounds)
+
+
+def sobol(n, seed=None, scramble=True, **bounds) -> ArrayPlan:
+    """First `n` points of a Sobol low-discrepancy sequence (requires scipy).
+    The balance properties of the sequence are kept when `n` is a power of two.
+
+    Parameters
+    ----------
+    n: int
+        Number of experiments.
+    seed: int or np.random.Generator, optional
+        Seed of the scrambling.
+    scramble: bool, optional
+    bounds: Tuple[float, float]
+        The lower and upper bounds of each input, e.g. `x=(0.0, 1.0)`.
+    """
+    from scipy.stats import qmc
+    sampler = qmc.Sobol(d=len(bounds), scramble=scramble, seed=seed)
+    return _scaled(sampler.random(n).T, bounds)
+
+
+def _scaled(unit, bounds) -> ArrayPlan:
+    """Plan with the rows of `unit` (in [0, 1)) scaled to the bounds of the inputs."""
+    return ArrayPlan(**{name: low + (high - low) * row
+                        for (name, (low, high)), row in zip(bounds.items(), unit)})
+
+
+def _radical_inverse(indices, base):
+    """The digits of the indices in the given base, mirrored around the decimal point."""
+    import numpy as np
+    result = np.zeros(len(indices))
+    factor = 1.0 / base
+    indices = indices.copy()
+    while np.any(indices > 0):
+        indices, digits = np.divmod(indices, base)
+        result += digits * factor
+        factor /= base
+    return result
+
+
+def _primes(n):
+    """The first n prime numbers."""
+    primes = []
+    candidate = 2
+    while len(primes) < n:
+        if all(candidate % p != 0 for p in primes):
+            primes.append(candidate)
+        candidate += 1
+    return primes
+
+
+# API
+
+def from_sequence(**kwargs) -> Plan:
+    plans = [SequencePlan(name, values) for name, values in kwargs.items()]
+    return plans[0] if len(plans) == 1 else ConcatenatedPlan(plans)
 
 def merge_dicts(ds: Sequence[Dict]) -> Dict:
     merged = {}
@@ -18,28 +540,38 @@ def merge_dicts(ds: Sequence[Dict]) -> Dict:
     return merged
 
 def combine_plans_and_sequences(plans, sequences):
-    plans = list(plans)
+    plans = [as_plan(plan) for plan in plans]
     for name, values in sequences.items():
-        plan = from_sequence(**{name: values})
-        plans.append(plan)
+        plans.append(SequencePlan(name, values))
     return plans
 
-def zip_plans(*plans, **sequences):
-    return map(merge_dicts, zip(*combine_plans_and_sequences(plans, sequences)))
+def zip_plans(*plans, **sequences) -> Plan:
+    return ZippedPlan(combine_plans_and_sequences(plans, sequences))
+
+def product_of_plans(*plans, **sequences) -> Plan:
+    return ProductPlan(combine_plans_and_sequences(plans, sequences))
+
+def cross_plans(*plans, pivot, **sequences) -> Plan:
+    return CrossPlan(combine_plans_and_sequences(plans, sequences), pivot)
 
-def product_of_plans(*plans, **sequences):
-    return map(merge_dicts, product(*combine_plans_and_sequences(plans, sequences)))
+def merge_shards(results):
+    """Concatenate the dataframes of the results of the shards of a plan.
+
+    Parameters
+    ----------
+    results: Sequence[pd.DataFrame] or Dict[int, pd.DataFrame]
+        The results of the shards in the order of the shards, or a dict
+        mapping the number of each shard to its results.
+    """
+    import pandas as pd
+    if isinstance(results, dict):
+        results = [results[k] for k in sorted(results)]
+    return pd.concat(list(results))
 
-def cross_plans(*plans, pivot, **sequences):
-    yield pivot
-    for plan in combine_plans_and_sequences(plans, sequences):
-        for experiment in plan:
-            current = copy(pivot)
-            current.update(experiment)
-            if current != pivot:
-                yield current
 
 if __name__ == "__main__":
+    import pandas as pd
+
     a = range(5)
     b = ['foo', 'bar', 'baz', 'moose', 'llama']
     c = range(100, 110)
@@ -54,4 +586,3 @@ if __name__ == "__main__":
     plan_1 = zip_plans(a=range(2), b=['foo', 'bar'])
     plan_2 = zip_plans(c=range(10))
     print(pd.DataFrame(cross_plans(plan_1, plan_2, pivot={'a': 1, 'b': 'bar', 'c': 0})))
-
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Deterministic fingerprints of labelled functions, pipelines and their inputs.
+
+Unlike the built-in `hash`, the fingerprints do not depend on the process in
+which they have been computed (for a given version of Python), such that they
+can be used as keys of caches shared between processes or stored on disk.
+"""
+
+import pickle
+from hashlib import blake2b
+from functools import partial, lru_cache
+from inspect import getsource
+from types import FunctionType, BuiltinFunctionType, MethodType, CodeType, ModuleType
+
+from .abstract import AbstractLabelledCallable, Unknown, _is_instance
+
+
+# API
+
+def fingerprint(obj) -> str:
+    """A hexadecimal digest of the content of `obj`.
+
+    Supported objects are the labelled functions and pipelines, Python
+    functions (hashed from their source, their bytecode and the values in
+    their closure), partials, builtin containers and scalars, NumPy arrays,
+    pandas objects and any other picklable object.
+
+    Raises
+    ------
+    TypeError
+        If the object can not be hashed deterministically.
+    """
+    h = blake2b(digest_size=16)
+    _update(h, obj, set())
+    return h.hexdigest()
+
+
+# INTERNALS
+
+def _update(h, obj, seen):
+    """Feed a type-tagged description of `obj` to the hash object `h`.
+    `seen` contains the ids of the containers being hashed, to handle
+    recursive references."""
+    update = _updaters_by_type.get(type(obj))
+    if update is not None:
+        update(h, obj, seen)
+        return
+
+    if id(obj) in seen:
+        h.update(b'<recursion>')
+        return
+    seen.add(id(obj))
+    try:
+        if isinstance(obj, AbstractLabelledCallable):
+            _update_tagged(h, type(obj).__name__, obj._fingerprint_data(), seen)
+        elif _is_instance(obj, "numpy", "ndarray"):
+            _update_array(h, obj, seen)
+        elif _is_instance(obj, "numpy", "generic"):
+            _update_tagged(h, 'numpy.' + obj.dtype.str, obj.tobytes(), seen)
+        elif _is_instance(obj, "pandas", "DataFrame") or _is_instance(obj, "pandas", "Series"):
+            _update_pandas(h, obj, seen)
+        elif isinstance(obj, (list, tuple)):
+            _update_tagged(h, type(obj).__name__, len(obj), seen)
+            for item in obj:
+                _update(h, item, seen)
+        elif isinstance(obj, dict):
+            _update_tagged(h, 'dict', _unordered_digests(obj.items(), seen), seen)
+        elif isinstance(obj, (set, frozenset)):
+            _update_tagged(h, 'set', _unordered_digests(obj, seen), seen)
+        elif isinstance(obj, partial):
+            _update_tagged(h, 'partial', (obj.func, obj.args, obj.keywords), seen)
+        elif isinstance(obj, FunctionType):
+            _update_function(h, obj, seen)
+        elif isinstance(obj, MethodType):
+            _update_tagged(h, 'method', (obj.__self__, obj.__func__), seen)
+        elif isinstance(obj, (BuiltinFunctionType, type)):
+            _update_tagged(h, 'global', f"{obj.__module__}.{obj.__qualname__}", seen)
+        elif isinstance(obj, ModuleType):
+            _update_tagged(h, 'module', obj.__name__, seen)
+        else:
+            try:
+                data = pickle.dumps(obj, protocol=4)
+            except Exception as e:
+                raise TypeError(f"Cannot fingerprint object of type {type(obj).__name__}") from e
+            _update_tagged(h, 'pickle', data, seen)
+    finally:
+        seen.discard(id(obj))
+
+
+def _update_tagged(h, tag, data, seen):
+    h.update(tag.encode())
+    h.update(b':')
+    _update(h, data, seen)
+
+
+def _update_scalar(h, obj, seen):
+    h.update(type(obj).__name__.encode())
+    h.update(b':')
+    h.update(repr(obj).encode())
+    h.update(b';')
+
+
+def _update_str(h, obj, seen):
+    data = obj.encode('utf-8', 'surrogatepass')
+    h.update(b'str:%d:' % len(data))
+    h.update(data)
+
+
+def _update_bytes(h, obj, seen):
+    h.update(b'bytes:%d:' % len(obj))
+    h.update(obj)
+
+
+_updaters_by_type = {
+    type(None): _update_scalar,
+    bool: _update_scalar,
+    int: _update_scalar,
+    float: _update_scalar,
+    complex: _update_scalar,
+    str: _update_str,
+    bytes: _update_bytes,
+    type(Unknown): lambda h, obj, seen: h.update(b'Unknown;'),
+}
+
+
+def _unordered_digests(items, seen):
+    """Sorted digests of the items, for the containers without a meaningful order."""
+    digests = []
+    for item in items:
+        h = blake2b(digest_size=16)
+        _update(h, item, seen)
+        digests.append(h.digest())
+    return b''.join(sorted(digests))
+
+
+def _update_array(h, array, seen):
+    import numpy as np
+    _update_tagged(h, 'ndarray', (array.dtype.str, array.shape), seen)
+    if array.dtype.hasobject:
+        for item in array.ravel():
+            _update(h, item, seen)
+    else:
+        h.update(np.ascontiguousarray(array).view(np.uint8).data)
+
+
+def _update_pandas(h, obj, seen):
+    import pandas as pd
+    if isinstance(obj, pd.DataFrame):
+        _update_tagged(h, 'DataFrame', (list(obj.columns), [str(t) for t in obj.dtypes]), seen)
+    else:
+        _update_tagged(h, 'Series', (obj.name, str(obj.dtype)), seen)
+    try:
+        hashes = pd.util.hash_pandas_object(obj, index=True).values
+    except TypeError:  # E.g. unhashable objects in the data
+        _update_tagged(h, 'pickle', pickle.dumps(obj, protocol=4), seen)
+    else:
+        _update_array(h, hashes, seen)
+
+
+def _update_function(h, function, seen):
+    _update_tagged(h, 'function', (
+        function.__module__, function.__qualname__,
+        _code_digest(function.__code__),
+        function.__defaults__, function.__kwdefaults__,
+        tuple(cell.cell_contents for cell in function.__closure__ or ()),
+    ), seen)
+
+
+@lru_cache(maxsize=1024)
+def _code_digest(code: CodeType) -> bytes:
+    """Digest of the source (when available) and of the bytecode of a code object.
+    The position of the code in its file is not taken into account."""
+    h = blake2b(digest_size=16)
+    try:
+        source = getsource(code)
+    except (OSError, TypeError):
+        source = None
+    _update(h, source, set())
+    _update_code(h, code)
+    return h.digest()
+
+
+def _update_code(h, code):
+    h.update(code.co_code)
+    _update(h, (code.co_argcount, code.co_kwonlyargcount, code.co_flags,
+                code.co_names, code.co_varnames, code.co_freevars, code.co_cellvars), set())
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            _update_code(h, const)
+        else:
+            _update(h, const, set())
+
@@ -1,15 +1,16 @@
 #!/usr/bin/env python
 # coding: utf-8
 
-from typing import List
+import sys
+from typing import List, Optional, Tuple
 from copy import copy
-from inspect import Parameter, Signature, getsource
+from inspect import Parameter, Signature, getsource, unwrap
 from collections import namedtuple
-from functools import update_wrapper, partial
+from functools import partial, lru_cache
+from textwrap import dedent
+import ast
 
-import parso
-
-from labelled_functions.abstract import Unknown, AbstractLabelledCallable
+from labelled_functions.abstract import Unknown, AbstractLabelledCallable, _FunctionDocstring
 
 
 # API
@@ -77,6 +78,11 @@ class LabelledFunction(AbstractLabelledCallable):
     >>> lf is llf
     True
 
+    As with `functools.wraps`, the docstring and the qualified name are the
+    ones of the function.
+    Only the attributes above are copied and sent to other processes, such
+    that it is cheap to do so. A labelled function defined at the top level of
+    a module (e.g. with the `@label` decorator) is pickled by reference.
     """
 
     def __init__(self,
@@ -108,12 +114,10 @@ class LabelledFunction(AbstractLabelledCallable):
         # OUTPUT
         if output_names is Unknown and function.__name__ != "<lambda>":
             # try:
-            source = getsource(function)
-            output_names = _get_output_names_from_source(source)
+            output_names = _get_output_names(function)
             # except (ValueError, TypeError):
             #     pass
 
-        update_wrapper(self, function)
         super().__init__(
             function,
             name=name,
@@ -123,14 +127,27 @@ class LabelledFunction(AbstractLabelledCallable):
         )
 
     def __copy__(self):
-        copied = LabelledFunction(
-            self.function,
-            name=self.name,
-            input_names=copy(self.input_names),
-            output_names=copy(self.output_names),
-            default_values=copy(self.default_values),
+        return _restore_labelled_function(
+            self.function, self.name,
+            copy(self.input_names), copy(self.output_names), copy(self.default_values),
+            self.vectorized, self.pure,
         )
-        return copied
+
+    def __reduce__(self):
+        module_name = getattr(self.function, '__module__', None)
+        qualname = getattr(self.function, '__qualname__', None)
+        labels = (self.name, self.input_names, self.output_names, self.default_values, self.vectorized, self.pure)
+        if module_name not in (None, '__main__') and qualname is not None \
+                and _lookup_global(module_name, qualname, import_module=False) is self:
+            return _lookup_labelled_function, (module_name, qualname, labels)
+        else:
+            return _restore_labelled_function, (self.function, *labels)
+
+    def __getattr__(self, name):
+        # Only called when the attribute has not been found otherwise.
+        if name == '__qualname__':
+            return getattr(self.function, '__qualname__')
+        raise AttributeError(f"'{self.__class__.__name__}' object has no attribute '{name}'")
 
     def __or__(self, other):
         if isinstance(other, LabelledFunction):
@@ -152,13 +169,24 @@ class LabelledFunction(AbstractLabelledCallable):
         return f"{self.name}({input_str}) -> ({output_str})"
 
     def fix(self, **names_to_fix):
-        return LabelledFunction(
-            function=partial(self.function, **names_to_fix),
+        if type(self.function) is partial:
+            # Merge with the previously fixed values instead of nesting partials.
+            function = partial(self.function.func, *self.function.args, **{**self.function.keywords, **names_to_fix})
+        else:
+            function = partial(self.function, **names_to_fix)
+        fixed = LabelledFunction(
+            function=function,
             name=self.name,
             input_names=[n for n in self.input_names if n not in names_to_fix.keys()],
             output_names=self.output_names,
             default_values={n: v for n, v in self.default_values.items() if n not in names_to_fix.keys()}
         )
+        fixed.vectorized = self.vectorized
+        fixed.pure = self.pure
+        return fixed
+
+    def _fingerprint_data(self):
+        return (self.function, self.input_names, self.output_names, self.default_values, self.vectorized, self.pure)
 
     def _graph(self):
         Edge = namedtuple('Edge', ['start', 'label', 'end'])
@@ -168,9 +196,107 @@ class LabelledFunction(AbstractLabelledCallable):
         return set(self.input_names), self.default_values, set(self.output_names), set([self.name]), set(), edges
 
 
+LabelledFunction.__doc__ = _FunctionDocstring(LabelledFunction.__doc__)
+
+
 # HELPER FUNCTIONS
 
+def _restore_labelled_function(function, name, input_names, output_names, default_values, vectorized, pure=False):
+    """Rebuild a labelled function from its attributes, without inspecting the function again."""
+    f = LabelledFunction.__new__(LabelledFunction)
+    AbstractLabelledCallable.__init__(f, function, name, input_names, output_names, default_values)
+    f.vectorized = vectorized
+    f.pure = pure
+    return f
+
+
+def _lookup_global(module_name, qualname, import_module=True):
+    """The object named `qualname` in the module.
+    Without `import_module`, returns None if the module has not been imported
+    or does not contain such an object."""
+    if import_module:
+        from importlib import import_module
+        obj = import_module(module_name)
+        for attr in qualname.split('.'):
+            obj = getattr(obj, attr)
+    else:
+        obj = sys.modules.get(module_name)
+        for attr in qualname.split('.'):
+            obj = getattr(obj, attr, None)
+    return obj
+
+
+def _lookup_labelled_function(module_name, qualname, labels):
+    """The labelled function defined at the top level of the module, or a copy
+    of it with the given labels if it has been labelled differently since then
+    (e.g. edited in place with `label` in the process that pickled it)."""
+    f = _lookup_global(module_name, qualname)
+    try:
+        same_labels = (f.name, f.input_names, f.output_names, f.default_values, f.vectorized, f.pure) == labels
+    except (TypeError, ValueError):  # e.g. default values that are numpy arrays
+        same_labels = False
+    if same_labels:
+        return f
+    else:
+        return _restore_labelled_function(f.function, *labels)
+
+
+def _get_output_names(function) -> List[str]:
+    """Output names of a function, guessed from its source code.
+    The result is cached for each code object, such that labelling again the
+    same function (or another closure with the same code) is cheap."""
+    code = getattr(unwrap(function), '__code__', None)
+    if code is None:
+        return _get_output_names_from_source(getsource(function))
+    return list(_output_names_of_code(code))
+
+@lru_cache(maxsize=1024)
+def _output_names_of_code(code) -> Tuple[str]:
+    return tuple(_get_output_names_from_source(getsource(code)))
+
 def _get_output_names_from_source(source: str) -> List[str]:
+    return list(_parse_output_names(source))
+
+@lru_cache(maxsize=1024)
+def _parse_output_names(source: str) -> Tuple[str]:
+    names = _parse_output_names_with_ast(source)
+    if names is None:
+        names = _parse_output_names_with_parso(source)
+    return tuple(names)
+
+# Binary operators that parso parses as "term" or "arith_expr"
+_ARITHMETIC_OPERATORS = (ast.Add, ast.Sub, ast.Mult, ast.MatMult, ast.Div, ast.FloorDiv, ast.Mod)
+
+def _parse_output_names_with_ast(source: str) -> Optional[List[str]]:
+    """Fast path of the parsing with the standard library, for the most
+    common cases. Returns None if the return statement should be parsed by
+    `_parse_output_names_with_parso` instead."""
+    source = dedent(source)
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return None
+
+    returns = [node for node in ast.walk(tree) if isinstance(node, ast.Return)]
+    if len(returns) == 0:
+        return []  # The function has no return statement.
+    value = max(returns, key=lambda node: (node.lineno, node.col_offset)).value
+
+    if isinstance(value, ast.Tuple) and not ast.get_source_segment(source, value).startswith("("):
+        expressions = value.elts
+    elif isinstance(value, (ast.Name, ast.Attribute, ast.Subscript, ast.Call)) \
+            or (isinstance(value, ast.BinOp) and isinstance(value.op, _ARITHMETIC_OPERATORS)):
+        expressions = [value]
+    else:
+        return None
+
+    names = [ast.get_source_segment(source, e) for e in expressions]
+    if any(name is None or "\n" in name for name in names):
+        return None  # Multiline expressions, whose indentation might have been changed by dedent.
+    return names
+
+def _parse_output_names_with_parso(source: str) -> List[str]:
+    import parso
     content = parso.parse(source)
     return_stmt = _find_return_in_tree(content)
     if return_stmt is None:
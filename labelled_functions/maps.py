@@ -2,47 +2,185 @@
 # coding: utf-8
 
 from itertools import product
+from time import perf_counter
 
-import numpy as np
-import pandas as pd
-import xarray as xr
-
+from .abstract import AbstractLabelledCallable, _is_instance
 from .labels import label
-from .decorators import keeping_inputs, with_progress_bar
+from .pipeline import LabelledPipeline
+from .decorators import keeping_inputs
+from .tracing import _span
+from .progress import _tracking
+from .doe import Plan
 
 
 # API
 
-def pandas_map(f, *args, progress_bar=False, n_jobs=1, **kwargs):
+def pandas_map(f, *args, progress_bar=False, progress=None, n_jobs=1, columnar=False, dtype_backend=None, **kwargs):
+    """Apply the labelled function to each set of inputs and return the
+    inputs and outputs as a dataframe.
+
+    The inputs can be given as keyword arguments (lists of values of the same
+    length), as a dataframe, as a dataset or as a plan of experiments (see `doe`).
+
+    In columnar mode, each function of a pipeline is applied to all the sets of
+    inputs before the next function starts: the functions marked with
+    `decorators.vectorized` are called once with the whole columns of inputs,
+    the other ones are called row by row (in parallel if n_jobs > 1).
+
+    With `progress_bar`, the progress is displayed with tqdm. The `progress`
+    argument can be a `progress.Progress` (e.g. to poll it from another
+    thread) or a function called with snapshots of the progress.
+
+    With `dtype_backend='pyarrow'`, the columns of the dataframe are backed
+    by Arrow arrays (`pd.ArrowDtype`), built chunk by chunk from the results.
+    Strings and nested outputs (e.g. lists) are then stored compactly instead
+    of as Python objects, and `pyarrow.Table.from_pandas(result)` or
+    `result.to_parquet(...)` reuse the Arrow arrays without copying them.
+    `dtype_backend='numpy_nullable'` is also supported, as in pandas.
+    """
     f = label(f)
     dict_of_lists = _preprocess_map_inputs(f.input_names, args, kwargs)
-    if n_jobs == 1:
-        if progress_bar:
-            f = with_progress_bar(f, total=len(any_value(dict_of_lists)))
-        data = list(lmap(keeping_inputs(f), **dict_of_lists))
-    else:
-        from joblib import Parallel, delayed
-        verbose = 20 if progress_bar else 0
-        data = Parallel(n_jobs=n_jobs, verbose=verbose)(lmap(delayed(keeping_inputs(f)), **dict_of_lists))
-    data = pd.DataFrame(data)
+    n_rows = len(any_value(dict_of_lists)) if len(dict_of_lists) > 0 else 0
+    with _span(f.name, f.input_names):
+        if columnar:
+            with _tracking(progress_bar, progress, _columnar_map_size(f, n_rows)) as tracker:
+                data = _columnar_map(f, dict_of_lists, n_jobs=n_jobs, progress=tracker)
+        else:
+            with _tracking(progress_bar, progress, n_rows) as tracker:
+                data = _starmap(keeping_inputs(f), lzip(**dict_of_lists), n_jobs=n_jobs, progress=tracker)
+    data = _as_dataframe(data, dtype_backend)
     return _set_index(f.input_names, data)
 
 
-def pandas_cartesian_product(f, *args, n_jobs=1, **kwargs):
+def pandas_cartesian_product(f, *args, progress_bar=False, progress=None, n_jobs=1, dtype_backend=None, where=None,
+                             warm_start=None, sweep_order='snake', **kwargs):
+    """Apply the labelled function to all the combinations of the inputs
+    and return the inputs and outputs as a dataframe.
+
+    For a pipeline, each function marked with `decorators.pure` is only
+    evaluated once for each combination of the inputs it depends on (unless
+    the function of the pipeline has been replaced, e.g. by
+    `decorators.decorate`). The other functions are evaluated for each
+    combination of all the inputs.
+    The `progress_bar`, `progress` and `dtype_backend` arguments are the same
+    as for `pandas_map`.
+
+    The `where` argument is a labelled function of some of the inputs (or a
+    list of them) returning whether a combination of the inputs is valid,
+    e.g. `where=lambda radius, length: radius <= length`. It is evaluated
+    during the enumeration of the combinations, as soon as the inputs it
+    depends on are fixed, such that the invalid combinations are skipped
+    without enumerating the other inputs, and are never evaluated.
+
+    The `warm_start` argument is a dict mapping an input of the function to
+    one of its outputs, e.g. `{'initial_guess': 'solution'}` for an iterative
+    solver. The combinations are then evaluated one after the other along a
+    path going from each combination to a neighbouring one (`sweep_order`
+    is 'snake' or 'hilbert'), and each call receives the outputs of the
+    previous call as warm-start inputs. The first call uses the default
+    values of the warm-start inputs. With n_jobs > 1, the path is split in a
+    chain per worker. The warm-start inputs are not included in the results,
+    that are in the usual order. The functions of a pipeline are then not
+    hoisted.
+    """
+    import pandas as pd
     f = label(f)
     dict_of_lists = _preprocess_map_inputs(f.input_names, args, kwargs)
-    if n_jobs == 1:
-        data = list(lcartesianmap(keeping_inputs(f), **dict_of_lists))
+    if where is not None:
+        # The name of the output of a predicate does not matter (and may not be parsable, e.g. `return a < b`).
+        predicates = [p if isinstance(p, AbstractLabelledCallable) else label(p, output_names=['where'])
+                      for p in (where if isinstance(where, (list, tuple)) else [where])]
+        defaults = _default_values_of_other_inputs(f, list(dict_of_lists.keys()))
+        valid_indices = list(_pruned_product_indices(dict_of_lists, predicates, defaults))
     else:
-        from joblib import Parallel, delayed
-        data = Parallel(n_jobs=n_jobs)(lcartesianmap(delayed(keeping_inputs(f)), **dict_of_lists))
-    data = pd.DataFrame(data)
+        valid_indices = None
+    if warm_start is not None:
+        with _span(f.name, f.input_names):
+            data = _warm_started_cartesian_product(f, dict_of_lists, warm_start, sweep_order, valid_indices,
+                                                   n_jobs=n_jobs, progress_bar=progress_bar, progress=progress)
+        index = [name for name in f.input_names if name not in warm_start]
+        if len(data) == 0:
+            data = pd.DataFrame(columns=list(dict.fromkeys([*index, *f.output_names])))
+        return _set_index(index, _as_dataframe(data, dtype_backend))
+    with _span(f.name, f.input_names):
+        if isinstance(f, LabelledPipeline) and f._runs_its_plan:
+            with _tracking(progress_bar, progress, _hoisted_cartesian_product_size(f, dict_of_lists, valid_indices)) as tracker:
+                data = list(_hoisted_cartesian_product(f, dict_of_lists, n_jobs=n_jobs, progress=tracker, valid_indices=valid_indices))
+        elif valid_indices is not None:
+            values = [list(vals) for vals in dict_of_lists.values()]
+            points = ({name: vals[i] for name, vals, i in zip(dict_of_lists.keys(), values, indices)}
+                      for indices in valid_indices)
+            with _tracking(progress_bar, progress, len(valid_indices)) as tracker:
+                data = _starmap(keeping_inputs(f), points, n_jobs=n_jobs, progress=tracker)
+        else:
+            n_rows = 1
+            for values in dict_of_lists.values():
+                n_rows *= len(values)
+            with _tracking(progress_bar, progress, n_rows) as tracker:
+                data = _starmap(keeping_inputs(f), lproduct(**dict_of_lists), n_jobs=n_jobs, progress=tracker)
+    if len(data) == 0:  # E.g. no valid combination
+        data = pd.DataFrame(columns=list(dict.fromkeys([*f.input_names, *f.output_names])))
+    data = _as_dataframe(data, dtype_backend)
     return _set_index(f.input_names, data)
 
 
 full_parametric_study = pandas_cartesian_product
 
 
+def xarray_apply(f, ds, *, chunks=None, output_dtypes=None):
+    """Lazily apply a labelled function or a pipeline to the variables of a
+    dataset with the same names as its inputs.
+
+    Each function of the pipeline (or the whole pipeline if its function has
+    been replaced, e.g. by `decorators.decorate`) is wrapped in
+    `xr.apply_ufunc`, such that on a dataset backed by dask arrays (see the
+    `chunks` argument), the result is a lazy task graph evaluated chunk by
+    chunk. The functions that are not marked as
+    `decorators.vectorized` are called element by element.
+
+    Parameters
+    ----------
+    f: labelled function or pipeline
+    ds: xr.Dataset
+    chunks: optional
+        If not None, the dataset is first chunked with `ds.chunk(chunks)`.
+    output_dtypes: Dict[str, dtype], optional
+        The types of the outputs. By default, they are guessed by calling each
+        function on the first element of its inputs.
+
+    Returns
+    -------
+    xr.Dataset
+        A new dataset with the outputs of the function added to it.
+    """
+    f = label(f)
+    if chunks is not None:
+        ds = ds.chunk(chunks)
+    if output_dtypes is None:
+        output_dtypes = {}
+
+    array_names = [name for name in f.input_names if name in ds.variables]
+    scalars = _default_values_of_other_inputs(f, array_names)
+
+    if isinstance(f, LabelledPipeline) and f._runs_its_plan:
+        scalars.update(f._constants)
+        plan = f._plan
+    else:
+        plan = [f]
+
+    namespace = ds
+    for stage in plan:
+        outputs = _xarray_apply_stage(stage, namespace, scalars, output_dtypes)
+        namespace = namespace.assign(outputs)
+        for var_name in outputs:
+            scalars.pop(var_name, None)
+
+    return ds.assign({
+        var_name: namespace[var_name] if var_name in namespace.variables else scalars[var_name]
+        for var_name in f.output_names
+    })
+
+
 # TOOLS
 
 def lstarmap(f, list_of_kwargs):
@@ -77,18 +215,437 @@ def lcartesianmap(f, **dict_of_lists):
     yield from lstarmap(f, list_of_dicts)
 
 
+def _pruned_product_indices(dict_of_lists, predicates, constants):
+    """Indices of the values of the combinations of the inputs for which all
+    the predicates are true, in the order of `itertools.product`.
+    Each predicate is checked as soon as the inputs it depends on are fixed."""
+    names = list(dict_of_lists.keys())
+    values = [list(vals) for vals in dict_of_lists.values()]
+
+    # The predicates to check once the first `depth + 1` inputs are fixed
+    checks = {}
+    for predicate in predicates:
+        depth = max((names.index(name) for name in predicate.input_names if name in names), default=-1)
+        checks.setdefault(depth, []).append(predicate)
+    last_check = max(checks.keys(), default=-1)
+
+    def is_valid(depth, indices):
+        point = {name: values[i][j] for i, (name, j) in enumerate(zip(names, indices))}
+        for predicate in checks.get(depth, []):
+            inputs = {name: point[name] if name in point else constants[name]
+                      for name in predicate.input_names if name in point or name in constants}
+            if not predicate(**inputs):
+                return False
+        return True
+
+    def extend(prefix):
+        depth = len(prefix)
+        if depth > last_check:
+            for rest in product(*(range(len(vals)) for vals in values[depth:])):
+                yield prefix + rest
+        else:
+            for j in range(len(values[depth])):
+                indices = prefix + (j,)
+                if is_valid(depth, indices):
+                    yield from extend(indices)
+
+    if is_valid(-1, ()):
+        yield from extend(())
+
+
+def _hoisted_cartesian_product_size(pipe, dict_of_lists, valid_indices=None):
+    """Number of calls made by `_hoisted_cartesian_product`."""
+    names = list(dict_of_lists.keys())
+    dependencies, _, _ = pipe._dependencies_on(names)
+    total = 0
+    for f_dependencies in dependencies:
+        if valid_indices is not None:
+            total += len(_projections(valid_indices, names, f_dependencies))
+            continue
+        n_calls = 1
+        for name in f_dependencies:
+            n_calls *= len(dict_of_lists[name])
+        total += n_calls
+    return total
+
+
+def _projections(valid_indices, names, dependencies):
+    """The distinct indices of the values of some of the inputs in the given combinations."""
+    positions = [names.index(name) for name in dependencies]
+    return list(dict.fromkeys(tuple(indices[p] for p in positions) for indices in valid_indices))
+
+
+def _hoisted_cartesian_product(pipe, dict_of_lists, n_jobs=1, progress=None, valid_indices=None):
+    """Cartesian product of a pipeline, in which each pure function of the
+    pipeline is evaluated only once for each combination of the swept inputs
+    it actually depends on. The results are then broadcasted to the whole
+    product. Yields the same records as
+    `lcartesianmap(keeping_inputs(pipe), **dict_of_lists)`.
+
+    If `valid_indices` is not None, only the combinations of the inputs with
+    these indices (see `_pruned_product_indices`) are evaluated and yielded.
+    """
+    names = list(dict_of_lists.keys())
+    values = {name: list(vals) for name, vals in dict_of_lists.items()}
+    sizes = {name: len(vals) for name, vals in values.items()}
+
+    defaults = _default_values_of_other_inputs(pipe, names)
+    constants = {**defaults, **pipe._constants}
+
+    dependencies, sources, last_modified = pipe._dependencies_on(names)
+
+    # For each function, a dict: indices of the swept inputs it depends on => outputs.
+    results = []
+
+    def value_of(var_name, source, point):
+        if source is not None:
+            return results[source][tuple(point[n] for n in dependencies[source])][var_name]
+        elif var_name in point:
+            return values[var_name][point[var_name]]
+        else:
+            return constants[var_name]
+
+    for f, f_dependencies, f_sources in zip(pipe._plan, dependencies, sources):
+
+        def inputs_of(indices):
+            point = dict(zip(f_dependencies, indices))
+            return {var_name: value_of(var_name, source, point)
+                    for var_name, source in f_sources.items()
+                    if source is not None or var_name in point or var_name in constants}
+
+        if valid_indices is None:
+            all_indices = list(product(*(range(sizes[n]) for n in f_dependencies)))
+        else:
+            all_indices = _projections(valid_indices, names, f_dependencies)
+        outputs = _starmap(f, map(inputs_of, all_indices), n_jobs=n_jobs, progress=progress)
+        results.append({indices: f._output_as_dict(o) for indices, o in zip(all_indices, outputs)})
+
+    if valid_indices is None:
+        valid_indices = product(*(range(sizes[n]) for n in names))
+    for indices in valid_indices:
+        point = dict(zip(names, indices))
+        record = {**defaults, **{name: values[name][i] for name, i in point.items()}}
+        for var_name in pipe.output_names:
+            record[var_name] = value_of(var_name, last_modified.get(var_name), point)
+        yield record
+
+
+def _warm_started_cartesian_product(f, dict_of_lists, warm_start, sweep_order, valid_indices=None,
+                                    n_jobs=1, progress_bar=False, progress=None):
+    """Records of the cartesian product evaluated along chains of neighbouring
+    combinations (see the `warm_start` argument of `pandas_cartesian_product`),
+    in the order of the product."""
+    names = list(dict_of_lists.keys())
+    for input_name, output_name in warm_start.items():
+        if input_name not in f.input_names or output_name not in f.output_names:
+            raise ValueError(f"Invalid warm start {input_name!r} <- {output_name!r}: "
+                             f"the inputs of {f.name} are {f.input_names} and its outputs are {f.output_names}")
+        if input_name in names:
+            raise ValueError(f"The warm-start input {input_name!r} can not be swept")
+    missing = [name for name in warm_start if name not in _default_values_of_other_inputs(f, names)]
+    if len(missing) > 0:
+        raise ValueError(f"The warm-start inputs {missing} need default values for the first calls")
+
+    values = [list(vals) for vals in dict_of_lists.values()]
+    sizes = [len(vals) for vals in values]
+    if valid_indices is None:
+        valid_indices = list(product(*(range(n) for n in sizes)))
+    path = sorted(range(len(valid_indices)), key=lambda i: _sweep_key(sweep_order, valid_indices[i], sizes))
+
+    if n_jobs == 1:
+        n_chains = 1
+    else:
+        from joblib import effective_n_jobs
+        n_chains = max(min(effective_n_jobs(n_jobs), len(path)), 1)
+    bounds = [k * len(path) // n_chains for k in range(n_chains + 1)]
+    chains = [path[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+    def points_of(chain):
+        return {'points': [{name: vals[j] for name, vals, j in zip(names, values, valid_indices[i])} for i in chain]}
+
+    with _tracking(progress_bar, progress, len(path)) as tracker:
+        results = _starmap(_WarmStartedChain(keeping_inputs(f), warm_start), map(points_of, chains),
+                           n_jobs=n_jobs, progress=tracker, calls_per_task=[len(chain) for chain in chains])
+
+    records = [None] * len(valid_indices)
+    for chain, chain_records in zip(chains, results):
+        for i, record in zip(chain, chain_records):
+            records[i] = record
+    return records
+
+
+class _WarmStartedChain:
+    """Calls the function on each point one after the other, passing some
+    outputs of each call as inputs of the next one."""
+
+    def __init__(self, f, warm_start):
+        self.f = f
+        self.warm_start = warm_start
+
+    def __call__(self, points):
+        records = []
+        previous_outputs = {}
+        for point in points:
+            record = self.f(**point, **previous_outputs)
+            previous_outputs = {input_name: record[output_name] for input_name, output_name in self.warm_start.items()}
+            for input_name in self.warm_start:
+                record.pop(input_name, None)
+            records.append(record)
+        return records
+
+
+def _sweep_key(sweep_order, indices, sizes):
+    """Key sorting the combinations of indices along a path going from each
+    combination to a neighbouring one."""
+    if sweep_order == 'snake':
+        return _snake_key(indices, sizes)
+    elif sweep_order == 'hilbert':
+        return _hilbert_key(indices, max(max(sizes, default=1) - 1, 1).bit_length())
+    else:
+        raise ValueError(f"Unknown sweep order {sweep_order!r}, expected 'snake' or 'hilbert'")
+
+
+def _snake_key(indices, sizes):
+    """Position in the boustrophedon order of the grid: each index goes back
+    and forth, its direction changing each time the previous indices change."""
+    positions = []
+    rank = 0  # Rank of the previous indices in this order
+    for i, n in zip(indices, sizes):
+        position = i if rank % 2 == 0 else n - 1 - i
+        positions.append(position)
+        rank = rank * n + position
+    return tuple(positions)
+
+
+def _hilbert_key(indices, bits):
+    """Position along the Hilbert curve filling the hypercube of side 2**bits
+    (J. Skilling, "Programming the Hilbert curve", 2004). When the sizes of
+    the grid are not powers of two, the path jumps over the missing points."""
+    x = list(indices)
+    n = len(x)
+    if n == 0:
+        return 0
+    m = 1 << (bits - 1)
+    q = m
+    while q > 1:
+        p = q - 1
+        for i in range(n):
+            if x[i] & q:
+                x[0] ^= p
+            else:
+                t = (x[0] ^ x[i]) & p
+                x[0] ^= t
+                x[i] ^= t
+        q >>= 1
+    for i in range(1, n):
+        x[i] ^= x[i - 1]
+    t = 0
+    q = m
+    while q > 1:
+        if x[n - 1] & q:
+            t ^= q - 1
+        q >>= 1
+    for i in range(n):
+        x[i] ^= t
+    key = 0
+    for b in range(bits - 1, -1, -1):
+        for i in range(n):
+            key = (key << 1) | ((x[i] >> b) & 1)
+    return key
+
+
+def _columnar_map_size(f, n_rows):
+    """Number of calls made by `_columnar_map`, counting a call of a
+    vectorized function as one call per row."""
+    return n_rows * (len(f._plan) if isinstance(f, LabelledPipeline) and f._runs_its_plan else 1)
+
+
+def _columnar_map(f, dict_of_lists, n_jobs=1, progress=None):
+    """Map of a labelled function or a pipeline, applying each function of the
+    pipeline to all the rows before the next one starts.
+    Returns a dict of columns containing the inputs and the outputs."""
+    import numpy as np
+    names = list(dict_of_lists.keys())
+    n_rows = len(any_value(dict_of_lists))
+    defaults = _default_values_of_other_inputs(f, names)
+
+    if isinstance(f, LabelledPipeline) and f._runs_its_plan:
+        constants, plan = f._constants, f._plan
+    else:
+        constants, plan = {}, [f]
+
+    scalars = {**defaults, **constants}  # variables with the same value on all rows
+    given_inputs = {name: list(values) for name, values in dict_of_lists.items()}  # Even if a stage reassigns them
+    columns = dict(given_inputs)
+
+    for stage in plan:
+        if stage.vectorized:
+            inputs = {var_name: np.asarray(columns[var_name]) if var_name in columns else scalars[var_name]
+                      for var_name in stage.input_names if var_name in columns or var_name in scalars}
+            start = perf_counter()
+            outputs = stage._output_as_dict(stage(**inputs))
+            if progress is not None:
+                progress.update(n_rows, busy_time=perf_counter() - start)
+        else:
+            def inputs_of(i):
+                return {var_name: columns[var_name][i] if var_name in columns else scalars[var_name]
+                        for var_name in stage.input_names if var_name in columns or var_name in scalars}
+            rows = [stage._output_as_dict(o) for o in _starmap(stage, map(inputs_of, range(n_rows)), n_jobs=n_jobs, progress=progress)]
+            outputs = {var_name: [row[var_name] for row in rows] for var_name in stage.output_names}
+
+        for var_name, value in outputs.items():
+            if stage.vectorized and np.ndim(value) == 0:
+                scalars[var_name] = value
+                columns.pop(var_name, None)
+            else:
+                columns[var_name] = value
+                scalars.pop(var_name, None)
+
+    def column(var_name):
+        return columns[var_name] if var_name in columns else [scalars[var_name]]*n_rows
+
+    return {
+        **{name: [value]*n_rows for name, value in defaults.items()},
+        **given_inputs,
+        **{var_name: column(var_name) for var_name in f.output_names},
+    }
+
+
+def _xarray_apply_stage(f, ds, scalars, output_dtypes):
+    import numpy as np
+    import xarray as xr
+    array_names = [name for name in f.input_names if name in ds.variables]
+    other_inputs = {name: scalars[name] for name in f.input_names if name not in ds.variables and name in scalars}
+
+    def func(*arrays):
+        outputs = f._output_as_dict(f(**dict(zip(array_names, arrays)), **other_inputs))
+        outputs = tuple(outputs[var_name] for var_name in f.output_names)
+        return outputs if len(outputs) > 1 else outputs[0]
+
+    missing_dtypes = [var_name for var_name in f.output_names if var_name not in output_dtypes]
+    if len(missing_dtypes) > 0:
+        # Computed with np.asarray, since the data might be a lazy dask array.
+        first_element = {name: np.asarray(ds[name].data.ravel()[:1]) for name in array_names}
+        if not f.vectorized:
+            first_element = {name: values[0] for name, values in first_element.items()}
+        first_outputs = f._output_as_dict(f(**first_element, **other_inputs))
+        dtypes = {var_name: _guess_dtype(first_outputs[var_name]) for var_name in f.output_names}
+        dtypes.update(output_dtypes)
+    else:
+        dtypes = output_dtypes
+
+    results = xr.apply_ufunc(
+        func, *(ds[name] for name in array_names),
+        dask='parallelized',
+        vectorize=not f.vectorized,
+        output_core_dims=[()]*len(f.output_names),
+        output_dtypes=[dtypes[var_name] for var_name in f.output_names],
+    )
+    if len(f.output_names) == 1:
+        results = (results,)
+    return dict(zip(f.output_names, results))
+
+
+def _guess_dtype(value):
+    """Type of the array of outputs, guessed from one of them. Strings are
+    stored as objects, since the other ones might be longer than the width of
+    the fixed-width string type of the first one."""
+    import numpy as np
+    dtype = np.asarray(value).dtype
+    return np.dtype(object) if dtype.kind in 'SU' else dtype
+
+
+def _starmap(f, list_of_kwargs, n_jobs=1, progress=None, calls_per_task=None):
+    """List of the results of `f(**kwargs)` for each kwargs, computed in
+    parallel with joblib if n_jobs > 1, reporting the calls to `progress`.
+    If a task makes several calls (e.g. a chain of calls), their numbers can
+    be given in `calls_per_task` to be reported to `progress`."""
+    calls_per_task = iter(calls_per_task) if calls_per_task is not None else None
+    if n_jobs == 1:
+        if progress is None:
+            return list(lstarmap(f, list_of_kwargs))
+        results = []
+        for kwargs in list_of_kwargs:
+            start = perf_counter()
+            results.append(f(**kwargs))
+            progress.update(next(calls_per_task) if calls_per_task is not None else 1,
+                            busy_time=perf_counter() - start)
+        return results
+
+    from joblib import Parallel, delayed
+    from .tracing import _is_active, _worker_hooks, _TracedTask, _replay_worker_events
+    from .progress import _TimedTask
+    traced = _is_active()
+    if traced:
+        # The spans of the calls in the workers are sent back with the results (see `tracing`).
+        f = _TracedTask(f, _worker_hooks)
+    if progress is None:
+        results = Parallel(n_jobs=n_jobs)(lstarmap(delayed(f), list_of_kwargs))
+    else:
+        parallel = Parallel(n_jobs=n_jobs, return_as="generator")
+        results = []
+        for result, worker, busy_time in parallel(lstarmap(delayed(_TimedTask(f)), list_of_kwargs)):
+            results.append(result)
+            progress.update(next(calls_per_task) if calls_per_task is not None else 1,
+                            worker=worker, busy_time=busy_time,
+                            queue_depth=max(parallel.n_dispatched_tasks - parallel.n_completed_tasks, 0))
+    if traced:
+        results = _replay_worker_events(results)
+    return results
+
+
+def _default_values_of_other_inputs(f, names):
+    """Check that the given names are enough to call the function and
+    return the default values of the other inputs."""
+    _, namespace = f._preprocess_inputs((), dict.fromkeys(names))
+    return {name: val for name, val in namespace.items() if name not in names}
+
+
 def _preprocess_map_inputs(input_names, args, kwargs) -> dict:
-    """When a dataframe or a dataset is passed, transfrom it into a dict of vectors"""
-    if len(args) == 1 and len(kwargs) == 0 and isinstance(args[0], pd.DataFrame):
+    """When a dataframe, a dataset or a plan of experiments (see `doe`) is
+    passed, transfrom it into a dict of vectors"""
+    if len(args) == 1 and len(kwargs) == 0 and isinstance(args[0], Plan):
+        columns = args[0].to_columns()
+        return {name: columns[name] for name in input_names if name in columns}
+    elif len(args) == 1 and len(kwargs) == 0 and _is_instance(args[0], "pandas", "DataFrame"):
         df = args[0]
         return {name: df[name] for name in input_names if name in df.columns}
-    elif len(args) == 1 and len(kwargs) == 0 and isinstance(args[0], xr.Dataset):
+    elif len(args) == 1 and len(kwargs) == 0 and _is_instance(args[0], "xarray", "Dataset"):
         ds = args[0]
         return {name: ds[name].data for name in input_names if name in ds.variables}
     else:
         return {**{name: val for name, val in zip(input_names, args)}, **kwargs}
 
 
+def _as_dataframe(data, dtype_backend=None):
+    """Dataframe of the results of a map: a list of records, a dict of
+    columns (see `_columnar_map`) or a dataframe."""
+    import pandas as pd
+    if dtype_backend is None:
+        return pd.DataFrame(data)
+    elif dtype_backend == 'pyarrow':
+        import pyarrow as pa
+        table = pa.Table.from_pandas(data, preserve_index=False) if isinstance(data, pd.DataFrame) else _arrow_table(data)
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+    else:
+        return pd.DataFrame(data).convert_dtypes(dtype_backend=dtype_backend)
+
+
+def _arrow_table(data, chunk_size=2**16):
+    """Arrow table of a list of records or of a dict of columns. The records
+    are converted chunk by chunk (the chunks are kept as the chunks of the
+    columns of the table), the columns as a whole."""
+    import pyarrow as pa
+    if isinstance(data, dict):
+        return pa.table({name: pa.array(list(column) if getattr(column, 'ndim', 1) != 1 else column)
+                         for name, column in data.items()})
+    chunks = [pa.Table.from_pylist(data[start:start + chunk_size]) for start in range(0, len(data), chunk_size)]
+    if len(chunks) == 0:
+        return pa.table({})
+    # The types inferred for the chunks can differ (e.g. integers in a chunk and floats or nulls in another one).
+    return pa.concat_tables(chunks, promote_options='permissive')
+
+
 def _set_index(indices, data):
     if len(indices) > 0:
         return data.set_index(indices)
@@ -0,0 +1,330 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Caches for the results of labelled functions (see `decorators.memoize`).
+
+A `Memoizer` looks up a result in a bounded in-memory LRU tier, then in an
+optional disk tier, before computing it. The keys are the fingerprints (see
+`hashing.fingerprint`) of the function and of its named inputs.
+"""
+
+import os
+import sys
+import pickle
+from collections import OrderedDict
+from functools import wraps
+from threading import RLock, get_ident
+from time import perf_counter
+
+from .abstract import _is_instance
+from .hashing import fingerprint
+
+
+class CacheStats:
+    """Counters of a `Memoizer`.
+
+    Attributes
+    ----------
+    hits: int
+        Number of calls whose result has been found in one of the tiers.
+    memory_hits, disk_hits: int
+        Same, for each tier.
+    misses: int
+        Number of calls whose result has been computed.
+    coalesced: int
+        Number of disk hits on results that were being computed by another
+        call (in this process or another one) when they have been requested.
+    evictions: int
+        Number of entries removed from a tier to respect its bounds.
+    time_saved: float
+        Sum of the computation times (in seconds) of the results that have
+        been found in the cache.
+    """
+
+    def __init__(self):
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.memory_evictions = 0
+        self.disk_evictions = 0
+        self.time_saved = 0.0
+
+    @property
+    def hits(self):
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def evictions(self):
+        return self.memory_evictions + self.disk_evictions
+
+    @property
+    def hit_rate(self):
+        calls = self.hits + self.misses
+        return self.hits / calls if calls > 0 else 0.0
+
+    def __repr__(self):
+        return (f"CacheStats(hits={self.hits}, misses={self.misses}, evictions={self.evictions}, "
+                f"time_saved={self.time_saved:.3g}s)")
+
+
+class Memoizer:
+    """A cache with an in-memory LRU tier and an optional disk tier.
+
+    Parameters
+    ----------
+    max_entries: int, optional
+        Maximum number of results kept in memory.
+    max_bytes: int, optional
+        Maximum total size of the results kept in memory.
+    directory: str, optional
+        If not None, the results are also stored in this directory, and
+        looked up there when they are not in memory anymore.
+    max_disk_bytes: int, optional
+        Maximum total size of the files in `directory`. The least recently
+        used files are removed first.
+    coalesce: bool, optional
+        If True (default), the calls sharing the same `directory` lock the
+        key of the result they are computing, such that when several
+        processes (e.g. the workers of a parallel map) request the same
+        missing result, only the first one computes it while the others
+        wait for it and read it from the disk. Requires `fcntl` (not
+        available on Windows).
+
+    Without bounds, the memory tier keeps all the results.
+    """
+
+    def __init__(self, max_entries=None, max_bytes=None, directory=None, max_disk_bytes=None, coalesce=True):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+
+        self._lock = RLock()
+        self._entries = OrderedDict()  # key => (value, computation time, size)
+        self._total_bytes = 0
+
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.coalesce = coalesce
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __repr__(self):
+        return f"Memoizer({len(self._entries)} entries in memory, {self.stats})"
+
+    def __getstate__(self):
+        # The memory tier and the statistics are not sent to other processes.
+        return {'max_entries': self.max_entries, 'max_bytes': self.max_bytes,
+                'directory': self.directory, 'max_disk_bytes': self.max_disk_bytes,
+                'coalesce': self.coalesce}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def wrap(self, function, function_fingerprint, input_names):
+        """A function with the same signature as `function`, whose results are cached.
+        The key of a call is built from `function_fingerprint` and from the
+        inputs, named with `input_names` when they are passed by position."""
+
+        @wraps(function)
+        def memoized_function(*args, **kwargs):
+            try:
+                key = fingerprint((function_fingerprint, {**dict(zip(input_names, args)), **kwargs}))
+            except TypeError:  # Some inputs can not be hashed
+                return function(*args, **kwargs)
+            return self.get_or_compute(key, function, args, kwargs)
+
+        memoized_function.cache = self
+        return memoized_function
+
+    def get_or_compute(self, key, function, args=(), kwargs=None):
+        """The result stored with this key, or else the result of `function(*args, **kwargs)`."""
+        found, value = self._get(key)
+        if found:
+            return value
+        if self.directory is not None and self.coalesce:
+            with _FileLock(self._path(key) + ".lock"):
+                # The result might have been computed while waiting for the lock.
+                found, value = self._get(key)
+                if found:
+                    with self._lock:
+                        self.stats.coalesced += 1
+                    return value
+                return self._compute(key, function, args, kwargs)
+        else:
+            return self._compute(key, function, args, kwargs)
+
+    def _compute(self, key, function, args, kwargs):
+        start = perf_counter()
+        value = function(*args, **(kwargs or {}))
+        duration = perf_counter() - start
+        with self._lock:
+            self.stats.misses += 1
+        self._set(key, value, duration)
+        return value
+
+    def clear(self):
+        """Remove all the results, in memory and on disk."""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+            if self.directory is not None:
+                for path, _, _ in self._disk_files(suffixes=(".pkl", ".lock")):
+                    _remove(path)
+
+    # LOOKUP
+
+    def _get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                value, duration, _ = self._entries[key]
+                self.stats.memory_hits += 1
+                self.stats.time_saved += duration
+                return True, value
+
+        if self.directory is not None:
+            found, (value, duration) = self._read(key)
+            if found:
+                with self._lock:
+                    self.stats.disk_hits += 1
+                    self.stats.time_saved += duration
+                self._set_in_memory(key, value, duration)
+                return True, value
+
+        return False, None
+
+    def _set(self, key, value, duration):
+        self._set_in_memory(key, value, duration)
+        if self.directory is not None:
+            self._write(key, value, duration)
+
+    def _set_in_memory(self, key, value, duration):
+        size = _size_of(value) if self.max_bytes is not None else 0
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)[2]
+            self._entries[key] = (value, duration, size)
+            self._total_bytes += size
+            while (self.max_entries is not None and len(self._entries) > self.max_entries) \
+                    or (self.max_bytes is not None and self._total_bytes > self.max_bytes):
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+                self.stats.memory_evictions += 1
+
+    # DISK TIER
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".pkl")
+
+    def _read(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                entry = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return False, (None, None)
+        _touch(path)
+        return True, entry
+
+    def _write(self, key, value, duration):
+        try:
+            data = pickle.dumps((value, duration), protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:  # The result can not be stored on disk.
+            return
+        _atomic_write(self._path(key), data)
+        if self.max_disk_bytes is not None:
+            self._evict_from_disk()
+
+    def _disk_files(self, suffixes=(".pkl",)):
+        """(path, size, last access) of the results stored on disk."""
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith(suffixes):
+                    try:
+                        stat = entry.stat()
+                    except OSError:  # Removed in the meantime
+                        continue
+                    files.append((entry.path, stat.st_size, stat.st_mtime))
+        return files
+
+    def _evict_from_disk(self):
+        files = self._disk_files()
+        total = sum(size for _, size, _ in files)
+        for path, size, _ in sorted(files, key=lambda f: f[2]):
+            if total <= self.max_disk_bytes:
+                break
+            if _remove(path):
+                with self._lock:
+                    self.stats.disk_evictions += 1
+            total -= size
+
+
+# HELPER FUNCTIONS
+
+class _FileLock:
+    """Exclusive lock on a file, shared between processes and threads.
+    Does nothing when `fcntl` is not available."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def __enter__(self):
+        try:
+            import fcntl
+        except ImportError:
+            return self
+        self.file = open(self.path, 'a')
+        fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.file is not None:
+            import fcntl
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+
+
+def _size_of(value) -> int:
+    """Approximate size in bytes of a result."""
+    if _is_instance(value, "numpy", "ndarray"):
+        return value.nbytes
+    elif _is_instance(value, "pandas", "DataFrame") or _is_instance(value, "pandas", "Series"):
+        return int(value.memory_usage(deep=True).sum())
+    elif isinstance(value, dict):
+        return sum(_size_of(k) + _size_of(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        return sum(_size_of(v) for v in value)
+    else:
+        try:
+            return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            return sys.getsizeof(value)
+
+
+def _atomic_write(path, data: bytes):
+    """Write the file such that other processes never read a partially written file."""
+    tmp_path = f"{path}.{os.getpid()}.{get_ident()}.tmp"
+    with open(tmp_path, 'wb') as file:
+        file.write(data)
+    os.replace(tmp_path, path)
+
+
+def _touch(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def _remove(path) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
+
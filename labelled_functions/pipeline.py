@@ -3,8 +3,9 @@
 
 from typing import Set
 from collections import namedtuple, defaultdict
-from toolz.itertoolz import groupby
-from toolz.dicttoolz import merge, keyfilter
+from functools import partial
+from queue import Queue, Full, Empty
+from threading import Thread, Event
 
 from labelled_functions.abstract import AbstractLabelledCallable
 from labelled_functions.labels import Unknown, label, LabelledFunction
@@ -21,58 +22,204 @@ def compose(funcs, **kwargs):
 # INTERNALS
 
 class LabelledPipeline(AbstractLabelledCallable):
+    """A sequence of labelled functions applied one after the other in a
+    common namespace.
+
+    The pipeline is described by a `_PipelineBuilder`, that can be shared with
+    other pipelines (e.g. the pipelines built by chaining `|`). The inputs,
+    outputs and execution plan of the pipeline are only computed when they are
+    first needed.
+    """
+
     def __init__(self,
                  funcs, *,
                  name=None, default_values=None,
                  return_intermediate_outputs=False
                  ):
+        builder = _PipelineBuilder()
+        for f in funcs:
+            builder.append(label(f))
+        self._set_builder(builder, len(builder.funcs),
+                          name=name, default_values=default_values,
+                          return_intermediate_outputs=return_intermediate_outputs)
+
+    @classmethod
+    def _from_builder(cls, builder, n, **kwargs):
+        pipe = cls.__new__(cls)
+        pipe._set_builder(builder, n, **kwargs)
+        return pipe
 
-        self.funcs = [label(f) for f in funcs]
+    def _set_builder(self, builder, n, *,
+                     name=None, default_values=None,
+                     return_intermediate_outputs=False
+                     ):
+        self._pipeline_builder = builder
+        self._n = n  # Number of functions of the builder used by this pipeline.
         self.return_intermediate_outputs = return_intermediate_outputs
 
-        if name is None:
-            name = " | ".join([f.name for f in self.funcs])
+        self._name = name
+        self._explicit_default_values = default_values if default_values is not None else {}
+        self._input_names = None
+        self._output_names = None
+        self._default_values = None
+        self._constants_and_plan = None
 
-        if any(f.output_names is Unknown for f in self.funcs):
-            raise AttributeError(f"Cannot build a pipeline with a function ({name}) whose outputs are unknown.")
+        self._call = None
+        self.function = self._run
+        self.vectorized = False
+        self.pure = False
+        self._has_never_been_run = True
 
-        self._graph_data = self._graph()
-        pipe_inputs, sub_default_values, pipe_outputs, *_ = self._graph_data
+    def _run(self, **namespace):
+        namespace.update(self._constants)
+        for f in self._plan:
+            namespace = f.apply_in_namespace(namespace)
+        result = {name: val for name, val in namespace.items() if name in self.output_names}
+        return result
 
-        if default_values is None:
-            sub_default_values = sub_default_values
-        else:
-            sub_default_values = {**sub_default_values, **default_values}
+    def __copy__(self):
+        copied = LabelledPipeline.__new__(LabelledPipeline)
+        copied.__dict__.update(self.__dict__)
+        copied._explicit_default_values = dict(self._explicit_default_values)
+        if self._default_values is not None:
+            copied._default_values = dict(self._default_values)
+        copied._call = None
+        copied.function = copied._run if self.function == self._run else self.function
+        copied.vectorized = self.vectorized
+        copied.pure = self.pure
+        copied._has_never_been_run = True
+        return copied
 
-        def function(**namespace):
-            for f in self.funcs:
-                namespace = f.apply_in_namespace(namespace)
-            result = {name: val for name, val in namespace.items() if name in self.output_names}
-            return result
-
-        super().__init__(
-            function=function,
-            name=name,
-            input_names=list(pipe_inputs),
-            output_names=list(pipe_outputs),
-            default_values=sub_default_values,
+    def __reduce__(self):
+        # Only the functions of this pipeline and its resolved attributes are
+        # pickled, not the builder (that may be shared with longer pipelines).
+        # The default function is a bound method of the pipeline itself and is
+        # not pickled, only the functions replacing it (see e.g. `decorate`).
+        function = None if self.function == self._run else self.function
+        return _restore_pipeline, (
+            self.funcs, self.name, self.input_names, self.output_names, self.default_values,
+            self._explicit_default_values, self.return_intermediate_outputs,
+            self._constants, self._plan, function, self.vectorized,
         )
 
+    # LAZY ATTRIBUTES
+
+    @property
+    def _builder(self):
+        if self._pipeline_builder is None:  # After unpickling (see `__reduce__`)
+            builder = _PipelineBuilder()
+            for f in self._funcs:
+                builder.append(f)
+            self._pipeline_builder = builder
+        return self._pipeline_builder
+
+    @property
+    def funcs(self):
+        if self._pipeline_builder is None:
+            return list(self._funcs)
+        return self._builder.funcs[:self._n]
+
+    @property
+    def name(self):
+        if self._name is None:
+            self._name = " | ".join([f.name for f in self.funcs])
+        return self._name
+
+    @name.setter
+    def name(self, name):
+        self._name = name
+
+    __name__ = name
+
+    @property
+    def input_names(self):
+        if self._input_names is None:
+            self._input_names = self._builder.input_names(self._n)
+        return self._input_names
+
+    @input_names.setter
+    def input_names(self, input_names):
+        self._input_names = input_names
+
+    @property
+    def output_names(self):
+        if self._output_names is None:
+            self._output_names = self._builder.output_names(self._n, self.return_intermediate_outputs)
+        return self._output_names
+
+    @output_names.setter
+    def output_names(self, output_names):
+        self._output_names = output_names
+
+    @property
+    def default_values(self):
+        if self._default_values is None:
+            self._default_values = {**self._builder.default_values(self._n), **self._explicit_default_values}
+            assert set(self._default_values.keys()) <= set(self.input_names)
+        return self._default_values
+
+    @default_values.setter
+    def default_values(self, default_values):
+        self._default_values = default_values
+
+    @property
+    def _constants(self):
+        """Outputs of the functions that have been evaluated at construction (see `_PipelineBuilder`)."""
+        if self._constants_and_plan is None:
+            self._constants_and_plan = self._builder.constants_and_plan(self._n)
+        return self._constants_and_plan[0]
+
+    @property
+    def _plan(self):
+        """Functions that have to be run at each call (see `_PipelineBuilder`)."""
+        if self._constants_and_plan is None:
+            self._constants_and_plan = self._builder.constants_and_plan(self._n)
+        return self._constants_and_plan[1]
+
+    @property
+    def _runs_its_plan(self):
+        """Whether a call runs the plan of the pipeline, that is its function
+        has not been replaced (e.g. by `decorators.decorate` or `memoize`).
+        Otherwise, the stages of the plan should not be run directly."""
+        return self.function == self._run
+
+    def _fingerprint_data(self):
+        # The default function only depends on the functions of the pipeline.
+        function = None if self.function == self._run else self.function
+        return (self.funcs, self.input_names, self.output_names, self.default_values, function)
+
+    # BUILDING
+
     def __repr__(self):
         return self.name + ':\n' + '\n'.join(('\t' + repr(f)) for f in self.funcs)
 
+    def _extended_with(self, funcs):
+        """A builder for this pipeline followed by `funcs`.
+        The builder of this pipeline is reused if no other pipeline has extended it."""
+        if len(self._builder.funcs) == self._n:
+            builder = self._builder
+        else:
+            builder = _PipelineBuilder()
+            for f in self.funcs:
+                builder.append(f)
+        for f in funcs:
+            builder.append(f)
+        return builder
+
     def __or__(self, other):
         if isinstance(other, LabelledFunction):
-            return pipeline(
-                [*self.funcs, other],
-                name=f"{self.name} | {other.name}",
+            builder = self._extended_with([other])
+            return LabelledPipeline._from_builder(
+                builder, len(builder.funcs),
+                name=None if self._name is None else f"{self.name} | {other.name}",
                 return_intermediate_outputs=self.return_intermediate_outputs,
                 default_values=_merge_default_values(self, other),
             )
         elif isinstance(other, LabelledPipeline):
-            return pipeline(
-                [*self.funcs, *other.funcs],
-                name=f"{self.name} | {other.name}",
+            builder = self._extended_with(other.funcs)
+            return LabelledPipeline._from_builder(
+                builder, len(builder.funcs),
+                name=None if self._name is None and other._name is None else f"{self.name} | {other.name}",
                 return_intermediate_outputs=self.return_intermediate_outputs or other.return_intermediate_outputs,
                 default_values=_merge_default_values(self, other),
             )
@@ -83,34 +230,61 @@ class LabelledPipeline(AbstractLabelledCallable):
         if isinstance(other, LabelledFunction):
             return pipeline(
                 [other, *self.funcs],
-                name=f"{other.name} | {self.name}",
+                name=None if self._name is None else f"{other.name} | {self.name}",
                 return_intermediate_outputs=self.return_intermediate_outputs,
                 default_values=_merge_default_values(other, self),
             )
         elif isinstance(other, LabelledPipeline):
-            return pipeline(
-                [*other.funcs, *self.funcs],
-                name=f"{other.name} | {self.name}",
-                return_intermediate_outputs=self.return_intermediate_outputs or other.return_intermediate_outputs,
-                default_values=_merge_default_values(other, self),
-            )
+            return other.__or__(self)
         else:
             return NotImplemented
 
-    def _which_input_is_used_by_this_function(self):
-        _, _, _, _, _, edges = self._graph_data
-        inputs_used_by = defaultdict(set)
-        for e in edges:
-            if e.start is None:
-                inputs_used_by[e.end].add(e.label)
-        return inputs_used_by
+    def _dependencies_on(self, names):
+        """Trace which of the given inputs of the pipeline each function depends on.
 
-    def fix(self, **names_to_fix):
-        inputs_used_by = self._which_input_is_used_by_this_function()
+        Returns
+        -------
+        dependencies: List[Tuple[str]]
+            For each function of the plan (see `_PipelineBuilder`), the names
+            (in the order of `names`) that its result depends on, directly or
+            through previous functions. The functions that are not marked as
+            pure (see `decorators.pure`) depend on all the names, since they
+            might return a different result at each call.
+        sources: List[Dict[str, Optional[int]]]
+            For each function and each of its inputs, the index of the
+            function that computed it or None if it is an input of the pipeline.
+        last_modified: Dict[str, int]
+            For each variable, the index of the function that returned it last.
+        """
+        dependencies = []
+        sources = []
+        last_modified = {}
+
+        for i, f in enumerate(self._plan):
+            f_sources = {}
+            f_dependencies = set()
+            for var_name in f.input_names:
+                if var_name in last_modified:
+                    f_sources[var_name] = last_modified[var_name]
+                    f_dependencies |= set(dependencies[last_modified[var_name]])
+                else:
+                    f_sources[var_name] = None
+                    if var_name in names:
+                        f_dependencies.add(var_name)
+            if not f.pure:
+                f_dependencies = set(names)
+            dependencies.append(tuple(n for n in names if n in f_dependencies))
+            sources.append(f_sources)
+
+            for var_name in f.output_names:
+                last_modified[var_name] = i
 
+        return dependencies, sources, last_modified
+
+    def fix(self, **names_to_fix):
         fixed_funcs = []
-        for f in self.funcs:
-            fixable_names = {k: v for k, v in names_to_fix.items() if k in inputs_used_by[f.name]}
+        for f, inputs_used_by_f in zip(self.funcs, self._builder.inputs_read):
+            fixable_names = {k: v for k, v in names_to_fix.items() if k in inputs_used_by_f}
             if len(fixable_names) > 0:
                 fixed_funcs.append(f.fix(**fixable_names))
             else:
@@ -124,6 +298,7 @@ class LabelledPipeline(AbstractLabelledCallable):
         )
 
     def _graph(self):
+        from toolz.itertoolz import groupby
         Edge = namedtuple('Edge', ['start', 'label', 'end'])
 
         pipe_inputs: Set[str] = set()
@@ -177,8 +352,331 @@ class LabelledPipeline(AbstractLabelledCallable):
             default_values=self.default_values
         )
 
+    def stream(self, records, *, threaded=False, buffer_size=1):
+        """Apply the pipeline to each dict of inputs of an iterable and yield
+        the dicts of outputs, lazily.
+
+        Parameters
+        ----------
+        records: Iterable[Dict[str, Any]]
+            The inputs of each call of the pipeline.
+        threaded: bool
+            If True, each function of the pipeline runs in its own thread,
+            such that I/O-bound functions can overlap with the others.
+        buffer_size: int
+            In threaded mode, the maximum number of records waiting between
+            two functions.
+        """
+        if threaded:
+            yield from _threaded_stream(self, records, buffer_size)
+        else:
+            for record in records:
+                yield self(**record)
+
+
+class _PipelineBuilder:
+    """Description of a sequence of labelled functions, that is built
+    incrementally: appending a function does not depend on the number of
+    functions already in the builder.
+
+    The builder is append-only, such that several pipelines can share it, each
+    of them using only its first `n` functions. The methods taking `n` as
+    argument return the data of the pipeline made of the first `n` functions.
+
+    When appended, a function is either:
+    * evaluated right away if it is marked as pure (see `decorators.pure`)
+    and all its inputs are known at construction (constant folding), that is
+    they have been fixed or they are the outputs of `let` or of other such
+    functions, and if its outputs are immutable (since they are shared by all
+    the calls);
+    * dropped if it is marked as pure and the same function has already been
+    applied to the same inputs and its outputs are still in the namespace
+    (common subexpression elimination);
+    * or added to the plan of the functions to be run at each call.
+    """
+
+    def __init__(self):
+        self.funcs = []
+
+        # Interface of the pipeline
+        self.inputs = {}  # variable name => index of the first function reading it as an input of the pipeline
+        self.defaults = defaultdict(list)  # variable name => (index of function, default value) for each function reading it as an input of the pipeline
+        self.productions = defaultdict(list)  # variable name => indices of the functions returning it
+        self.consumptions = defaultdict(list)  # variable name => indices of the functions reading it after it has been returned
+        self.inputs_read = []  # for each function, the inputs of the pipeline that it reads
+        self.last_modified = {}  # variable name => index of the function that returned it last
+
+        # Constant folding
+        self.constants = []  # (index of function, outputs) for each folded function
+        self.known = {}  # variable name => current value, for the variables whose current value is a constant
+        self.unknown = set()  # variables read or returned by a function of the plan
+
+        # Plan and common subexpression elimination
+        self.plan = []  # (index of function, function) for each function of the plan
+        self.plan_keys = []  # for each function of the plan, the description of what it computes
+        self.plan_last_modified = {}  # variable name => index in the plan of the function that returned it last
+
+    def append(self, f):
+        if f.output_names is Unknown:
+            raise AttributeError(f"Cannot build a pipeline with a function ({f.name}) whose outputs are unknown.")
+
+        i = len(self.funcs)
+        self.funcs.append(f)
+
+        inputs_read = []
+        for var_name in f.input_names:
+            if var_name in self.last_modified:  # This variable is the output of a previous function.
+                self.consumptions[var_name].append(i)
+            else:  # The variable must be a global input.
+                inputs_read.append(var_name)
+                self.inputs.setdefault(var_name, i)
+                if var_name in f.default_values:
+                    self.defaults[var_name].append((i, f.default_values[var_name]))
+        self.inputs_read.append(inputs_read)
+
+        for var_name in f.output_names:
+            self.last_modified[var_name] = i
+            self.productions[var_name].append(i)
+
+        outputs = self._folded_outputs(f)
+        if outputs is not None:
+            self.constants.append((i, outputs))
+            self.known.update(outputs)
+        else:
+            # All the inputs are marked, including the known ones: a later
+            # function returning one of them can not be folded, since its
+            # constant output would be read by this function instead.
+            self.unknown |= set(f.input_names)
+            self.unknown |= set(f.output_names)
+            for var_name in f.output_names:
+                self.known.pop(var_name, None)
+            key = self._key(f)
+            if not (f.pure and self._has_already_been_computed(key, f.output_names)):
+                self._add_to_plan(i, f, key)
+
+    def _folded_outputs(self, f):
+        """The outputs of the function if it can be evaluated at construction, else None."""
+        foldable = (
+            f.pure
+            and all(var_name in self.known for var_name in f.input_names)
+            # Adding the outputs at the beginning of the call should not
+            # shadow an input or the output of a previous function.
+            and not any(var_name in self.unknown for var_name in f.output_names)
+        )
+        if not foldable:
+            return None
+        outputs = f._output_as_dict(f(**{var_name: self.known[var_name] for var_name in f.input_names}))
+        if not all(_is_immutable(value) for value in outputs.values()):
+            return None  # The next functions could modify them in place.
+        return outputs
+
+    def _key(self, f):
+        sources = tuple(self.plan_last_modified.get(var_name) for var_name in f.input_names)
+        return (*_unwrap_partial(f.function), f.input_names, f.output_names, f.default_values, f.pure, sources)
+
+    def _has_already_been_computed(self, key, output_names):
+        """Whether the outputs are still the ones of the same computation.
+        Only the function of the plan that returned them last has to be checked."""
+        if len(output_names) == 0:
+            return False
+        j = self.plan_last_modified.get(output_names[0])
+        return (
+            j is not None
+            and all(self.plan_last_modified.get(var_name) == j for var_name in output_names)
+            and _same_computation(key, self.plan_keys[j])
+        )
+
+    def _add_to_plan(self, i, f, key):
+        j = len(self.plan)
+        for var_name in f.output_names:
+            self.plan_last_modified[var_name] = j
+        self.plan.append((i, f))
+        self.plan_keys.append(key)
+
+    # DATA OF THE PIPELINE MADE OF THE n FIRST FUNCTIONS
+
+    def input_names(self, n):
+        return [var_name for var_name, i in self.inputs.items() if i < n]
+
+    def default_values(self, n):
+        default_values = {}
+        for var_name, defaults in self.defaults.items():
+            defaults = [value for i, value in defaults if i < n]
+            if len(defaults) > 0:
+                default_values[var_name] = defaults[-1]
+        return default_values
+
+    def output_names(self, n, return_intermediate_outputs=False):
+        output_names = []
+        for var_name, productions in self.productions.items():
+            productions = [i for i in productions if i < n]
+            if len(productions) > 0:
+                last = productions[-1]
+                if return_intermediate_outputs or not any(last < i < n for i in self.consumptions[var_name]):
+                    output_names.append(var_name)
+        return output_names
+
+    def produces(self, var_name, n):
+        return var_name in self.productions and self.productions[var_name][0] < n
+
+    def constants_and_plan(self, n):
+        constants = {}
+        for i, outputs in self.constants:
+            if i < n:
+                constants.update(outputs)
+        plan = [f for i, f in self.plan if i < n]
+        return constants, plan
+
+
+def _is_immutable(value):
+    if value is None or isinstance(value, (bool, int, float, complex, str, bytes, range, frozenset)):
+        return True
+    elif isinstance(value, tuple):
+        return all(_is_immutable(v) for v in value)
+    else:
+        return type(value).__module__ == 'numpy' and not hasattr(value, '__setitem__')  # numpy scalars
+
+
+def _unwrap_partial(function):
+    """Returns the underlying function and the arguments fixed by (possibly
+    nested) partials."""
+    args, keywords = (), {}
+    while isinstance(function, partial):
+        args = (*function.args, *args)
+        keywords = {**function.keywords, **keywords}
+        function = function.func
+    return function, args, keywords
+
+def _same_computation(first_key, second_key):
+    first_function, *first_key = first_key
+    second_function, *second_key = second_key
+    return first_function is second_function and _same_value(first_key, second_key)
+
+def _same_value(a, b):
+    """Conservative equality test: False when in doubt (e.g. for arrays)."""
+    if a is b:
+        return True
+    elif type(a) is not type(b):
+        return False
+    elif isinstance(a, (list, tuple)):
+        return len(a) == len(b) and all(_same_value(x, y) for x, y in zip(a, b))
+    elif isinstance(a, dict):
+        return a.keys() == b.keys() and all(_same_value(a[k], b[k]) for k in a)
+    else:
+        try:
+            return bool(a == b)
+        except Exception:
+            return False
+
+_END_OF_STREAM = object()
+
+class _FailedRecord:
+    def __init__(self, exception):
+        self.exception = exception
+
+def _threaded_stream(pipe, records, buffer_size):
+    """Run the functions of the pipeline in a chain of threads connected by bounded queues.
+    A pipeline whose function has been replaced (e.g. by `decorators.decorate`)
+    runs as a whole in a single thread."""
+    if pipe._runs_its_plan:
+        constants, plan = pipe._constants, pipe._plan
+    else:
+        constants, plan = {}, [pipe]
+    output_names = set(pipe.output_names)
+    queues = [Queue(maxsize=buffer_size) for _ in range(len(plan) + 1)]
+    stop = Event()  # Set when the consumer stops iterating.
+
+    def put(queue, item):
+        while not stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return
+            except Full:
+                pass
+
+    def get(queue):
+        while not stop.is_set():
+            try:
+                return queue.get(timeout=0.1)
+            except Empty:
+                pass
+        return _END_OF_STREAM
+
+    def feed():
+        try:
+            for record in records:
+                if stop.is_set():
+                    return
+                _, namespace = pipe._preprocess_inputs((), record)
+                namespace.update(constants)
+                put(queues[0], namespace)
+        except Exception as e:
+            put(queues[0], _FailedRecord(e))
+        put(queues[0], _END_OF_STREAM)
+
+    def run(f, input_queue, output_queue):
+        while True:
+            namespace = get(input_queue)
+            if namespace is not _END_OF_STREAM and not isinstance(namespace, _FailedRecord):
+                try:
+                    namespace = f.apply_in_namespace(namespace)
+                except Exception as e:
+                    namespace = _FailedRecord(e)
+            put(output_queue, namespace)
+            if namespace is _END_OF_STREAM:
+                return
+
+    threads = [Thread(target=feed, daemon=True)]
+    threads += [Thread(target=run, args=(f, queues[i], queues[i+1]), daemon=True) for i, f in enumerate(plan)]
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            namespace = queues[-1].get()
+            if namespace is _END_OF_STREAM:
+                return
+            elif isinstance(namespace, _FailedRecord):
+                raise namespace.exception
+            yield {name: val for name, val in namespace.items() if name in output_names}
+    finally:
+        stop.set()
+
+def _restore_pipeline(funcs, name, input_names, output_names, default_values,
+                      explicit_default_values, return_intermediate_outputs,
+                      constants, plan, function, vectorized):
+    pipe = LabelledPipeline._from_builder(
+        None, len(funcs),
+        name=name, default_values=dict(explicit_default_values),
+        return_intermediate_outputs=return_intermediate_outputs,
+    )
+    pipe._funcs = funcs
+    pipe.input_names = list(input_names)
+    pipe.output_names = list(output_names)
+    pipe.default_values = dict(default_values)
+    pipe._constants_and_plan = (constants, plan)
+    if function is not None:
+        pipe.function = function
+    pipe.vectorized = vectorized
+    return pipe
+
+
+def _explicit_default_values(f):
+    """The default values that would not be recovered from the functions of the pipeline."""
+    if isinstance(f, LabelledPipeline):
+        return f._explicit_default_values if f._default_values is None else f._default_values
+    else:
+        return {}
+
 def _merge_default_values(first, second):
+    """The default values of `second` take precedence over the ones of `first`,
+    except for the outputs of `first`. Only the default values of `second` are
+    listed, so that extending a long pipeline does not depend on its length."""
+    if isinstance(first, LabelledPipeline):
+        is_output_of_first = lambda name: first._builder.produces(name, first._n)
+    else:
+        is_output_of_first = lambda name: name in first.output_names
     return {
-        **first.default_values,
-        **{name: value for name, value in second.default_values.items() if name not in first.output_names},
+        **_explicit_default_values(first),
+        **{name: value for name, value in second.default_values.items() if not is_output_of_first(name)},
     }
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Per-stage profiling of labelled functions, pipelines and maps.
+
+>>> with profile() as profiler:
+...     pandas_map(pipe, x=range(100))
+>>> profiler.report()
+
+While a profiler is active, the calls of all the labelled functions are
+timed. A call is attributed to a *stage* (the function being called) of a
+*function* (the outermost labelled function being called, or the function
+passed to the map). The time spent in the user's code is separated from the
+overhead of the framework (binding the inputs, updating the namespace of the
+pipelines, etc.). The profiler is a hook of `tracing`, such that no time is
+measured when no profiler is active.
+
+With `profile(memory=True)`, the peak memory allocated during each call
+(traced with `tracemalloc`) and the approximate size of each output are
+recorded too, to find the stages inflating the namespace of a pipeline.
+Tracing the allocations slows down the calls.
+"""
+
+import sys
+from contextlib import contextmanager, ExitStack
+
+from .tracing import hooks
+
+
+# API
+
+class Profiler:
+    """Samples recorded by `profile`.
+
+    Attributes
+    ----------
+    samples: List[Tuple[str, str, float, float, Optional[int], Optional[Dict[str, int]]]]
+        For each call, the name of the function, the name of the stage, the
+        total duration of the call, the time spent in the user's code, and
+        when the memory is profiled, the peak memory allocated during the
+        call and the sizes of the outputs (in bytes).
+    """
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self.samples = []
+
+    def report(self):
+        """Statistics of the calls of each stage of each profiled function.
+
+        Returns
+        -------
+        pd.DataFrame
+            Indexed by function and stage, with the number of calls, the total,
+            mean and percentiles of the duration of the calls, and the total
+            time spent in the user's code and in the framework.
+            When the memory is profiled, also the largest peak memory of the
+            calls and the mean total size of their outputs (in bytes).
+        """
+        import pandas as pd
+        data = pd.DataFrame(self.samples, columns=['function', 'stage', 'time', 'user_time', 'peak_memory', 'output_sizes'])
+        grouped = data.groupby(['function', 'stage'], sort=False)
+        report = pd.DataFrame({
+            'count': grouped['time'].count(),
+            'total': grouped['time'].sum(),
+            'mean': grouped['time'].mean(),
+            'p50': grouped['time'].quantile(0.5),
+            'p90': grouped['time'].quantile(0.9),
+            'p99': grouped['time'].quantile(0.99),
+            'user': grouped['user_time'].sum(),
+        })
+        report['overhead'] = report['total'] - report['user']
+        if self.memory:
+            data['output_size'] = data['output_sizes'].map(lambda sizes: sum(sizes.values()))
+            report['peak_memory'] = grouped['peak_memory'].max()
+            report['output_size'] = data.groupby(['function', 'stage'], sort=False)['output_size'].mean()
+        return report.sort_values('total', ascending=False)
+
+    def output_sizes(self):
+        """Sizes of the outputs of each stage of each profiled function
+        (requires `profile(memory=True)`).
+
+        Returns
+        -------
+        pd.DataFrame
+            Indexed by function, stage and output variable, with the mean and
+            the largest size of the variable (in bytes).
+        """
+        import pandas as pd
+        data = pd.DataFrame(
+            [(function, stage, var_name, size)
+             for function, stage, _, _, _, sizes in self.samples if sizes is not None
+             for var_name, size in sizes.items()],
+            columns=['function', 'stage', 'variable', 'size'],
+        )
+        grouped = data.groupby(['function', 'stage', 'variable'], sort=False)['size']
+        return pd.DataFrame({'mean': grouped.mean(), 'max': grouped.max()}).sort_values('max', ascending=False)
+
+    def _on_call_end(self, span):
+        if span.kind != 'call' or span.error is not None:
+            return
+        if span.parent is not None and span.parent.kind == 'call' and span.parent.name == span.name:
+            return  # A wrapper with the same name (e.g. `keeping_inputs`) is recorded as a single stage.
+        self.samples.append((span.root.name, span.name, span.duration, span.user_time,
+                             span.metrics.get('peak_memory'), span.metrics.get('output_sizes')))
+
+
+@contextmanager
+def profile(memory=False):
+    """Context manager recording the calls of labelled functions in a `Profiler`.
+
+    Profilers can be nested: each active profiler records all the calls.
+
+    Parameters
+    ----------
+    memory: bool, optional
+        Also record the peak memory allocated during each call and the
+        sizes of the outputs. The peak of a call includes the memory
+        allocated by the other threads in the meantime.
+    """
+    profiler = Profiler(memory=memory)
+    with ExitStack() as stack:
+        if memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                stack.callback(tracemalloc.stop)
+            stack.enter_context(hooks(_measure_memory_at_start, _measure_memory_at_end, in_workers=True))
+        stack.enter_context(hooks(on_call_end=profiler._on_call_end))
+        yield profiler
+
+
+# INTERNALS
+
+_memory_states = {}  # id of a span => [traced memory at start, peak so far, whether tracemalloc has been started]
+
+def _measure_memory_at_start(span):
+    """Hook starting the measure of the peak memory of a call.
+    Since `tracemalloc` only tracks a single peak, the peak of the calling
+    span is saved in its state before being reset for the nested call."""
+    import tracemalloc
+    started = not tracemalloc.is_tracing()  # E.g. in a worker process
+    if started:
+        tracemalloc.start()
+    current, peak = tracemalloc.get_traced_memory()
+    parent_state = _memory_states.get(id(span.parent))
+    if parent_state is not None:
+        parent_state[1] = max(parent_state[1], peak)
+    tracemalloc.reset_peak()
+    _memory_states[id(span)] = [current, current, started]
+
+
+def _measure_memory_at_end(span):
+    import tracemalloc
+    state = _memory_states.pop(id(span), None)
+    if state is None:
+        return
+    start, peak_so_far, started = state
+    peak = max(peak_so_far, tracemalloc.get_traced_memory()[1])
+    span.metrics['peak_memory'] = peak - start
+    if span.error is None:
+        span.metrics['output_sizes'] = {var_name: _approximate_size(value) for var_name, value in span.outputs.items()}
+    parent_state = _memory_states.get(id(span.parent))
+    if parent_state is not None:
+        parent_state[1] = max(parent_state[1], peak)
+    tracemalloc.reset_peak()
+    if started:
+        tracemalloc.stop()
+
+
+def _approximate_size(value, depth=0) -> int:
+    """Size in bytes of a value, including the items of the containers."""
+    if hasattr(value, 'nbytes') and not isinstance(value, type):  # numpy, xarray
+        return int(value.nbytes)
+    elif hasattr(value, 'memory_usage') and not isinstance(value, type):  # pandas
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if hasattr(usage, 'sum') else usage)
+    elif isinstance(value, (list, tuple, set, frozenset)) and depth < 10:
+        return sys.getsizeof(value) + sum(_approximate_size(item, depth + 1) for item in value)
+    elif isinstance(value, dict) and depth < 10:
+        return sys.getsizeof(value) + sum(_approximate_size(k, depth + 1) + _approximate_size(v, depth + 1)
+                                          for k, v in value.items())
+    else:
+        return sys.getsizeof(value)
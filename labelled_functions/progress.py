@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Progress of the maps, for all the backends (serial, parallel, columnar, ...).
+
+>>> progress = Progress(callback=print, interval=1.0)
+>>> pandas_map(f, x=range(1000), n_jobs=4, progress=progress)
+
+The `Progress` can also be polled from another thread with
+`progress.snapshot()`, e.g. to feed a dashboard. With `progress_bar=True`,
+the maps display the progress with tqdm.
+"""
+
+import os
+from collections import namedtuple
+from contextlib import contextmanager
+from threading import Lock
+from time import perf_counter
+
+
+ProgressSnapshot = namedtuple('ProgressSnapshot', [
+    'completed',     # Number of calls done
+    'total',         # Number of calls to do
+    'elapsed',       # Seconds since the beginning of the map
+    'rate',          # Calls per second
+    'eta',           # Estimated number of seconds before the end (None if unknown)
+    'queue_depth',   # Number of calls sent to the workers and not done yet
+    'utilization',   # For each worker (process id), fraction of the elapsed time spent in the calls
+])
+
+
+class Progress:
+    """Telemetry of a map, updated by the map and read with `snapshot`.
+
+    Parameters
+    ----------
+    callback: Callable[[ProgressSnapshot], None] or list of them, optional
+        Called with a snapshot of the progress after each update, at most
+        once every `interval` seconds, and at the end of the map.
+    interval: float, optional
+    """
+
+    def __init__(self, callback=None, interval=0.1):
+        if callback is None:
+            self.callbacks = []
+        elif callable(callback):
+            self.callbacks = [callback]
+        else:
+            self.callbacks = list(callback)
+        self.interval = interval
+        self._lock = Lock()
+        self.start(0)
+
+    def start(self, total):
+        """Reset the counters at the beginning of a map of `total` calls."""
+        with self._lock:
+            self.total = total
+            self.completed = 0
+            self.queue_depth = 0
+            self.busy_time = {}  # worker => seconds
+            self._start_time = perf_counter()
+            self._end_time = None
+            self._last_notification = float('-inf')
+
+    def update(self, n=1, worker=None, busy_time=0.0, queue_depth=None):
+        """Record that `n` calls have been done by `worker` in `busy_time` seconds."""
+        with self._lock:
+            self.completed += n
+            worker = os.getpid() if worker is None else worker
+            self.busy_time[worker] = self.busy_time.get(worker, 0.0) + busy_time
+            if queue_depth is not None:
+                self.queue_depth = queue_depth
+            now = perf_counter()
+            notify = now - self._last_notification >= self.interval
+            if notify:
+                self._last_notification = now
+        if notify:
+            self._notify()
+
+    def finish(self):
+        with self._lock:
+            self._end_time = perf_counter()
+            self.queue_depth = 0
+        self._notify()
+
+    def snapshot(self) -> ProgressSnapshot:
+        with self._lock:
+            end = self._end_time if self._end_time is not None else perf_counter()
+            elapsed = end - self._start_time
+            rate = self.completed / elapsed if elapsed > 0 else 0.0
+            if self.completed >= self.total:
+                eta = 0.0
+            elif rate > 0:
+                eta = (self.total - self.completed) / rate
+            else:
+                eta = None
+            utilization = {worker: (busy / elapsed if elapsed > 0 else 0.0)
+                           for worker, busy in self.busy_time.items()}
+            return ProgressSnapshot(self.completed, self.total, elapsed, rate, eta, self.queue_depth, utilization)
+
+    def _notify(self):
+        if len(self.callbacks) > 0:
+            snapshot = self.snapshot()
+            for callback in self.callbacks:
+                callback(snapshot)
+
+
+class TqdmDisplay:
+    """Callback of a `Progress` displaying it as a tqdm progress bar."""
+
+    def __init__(self, **tqdm_kwargs):
+        self.tqdm_kwargs = {'unit': "calls", **tqdm_kwargs}
+        self.bar = None
+
+    def __call__(self, snapshot):
+        if self.bar is None:
+            from tqdm import tqdm
+            self.bar = tqdm(total=snapshot.total, **self.tqdm_kwargs)
+        self.bar.total = snapshot.total
+        self.bar.update(snapshot.completed - self.bar.n)
+        if len(snapshot.utilization) > 1 or snapshot.queue_depth > 0:
+            mean_utilization = sum(snapshot.utilization.values()) / max(len(snapshot.utilization), 1)
+            self.bar.set_postfix(queue=snapshot.queue_depth, workers=len(snapshot.utilization),
+                                 utilization=f"{mean_utilization:.0%}", refresh=False)
+        if snapshot.completed >= snapshot.total:
+            self.bar.close()
+            self.bar = None
+
+
+# INTERNALS
+
+@contextmanager
+def _tracking(progress_bar, progress, total):
+    """The `Progress` of a map of `total` calls (or None if there is none to track)."""
+    if progress is not None and not isinstance(progress, Progress):
+        progress = Progress(callback=progress)
+    if progress_bar:
+        display = TqdmDisplay()
+        if progress is None:
+            progress = Progress(callback=display)
+        else:
+            progress.callbacks.append(display)
+    if progress is None:
+        yield None
+        return
+    progress.start(total)
+    try:
+        yield progress
+    finally:
+        progress.finish()
+        if progress_bar:
+            progress.callbacks.remove(display)
+
+
+class _TimedTask:
+    """Wraps a function sent to a worker process, such that the worker and the
+    duration of the call are returned with its result."""
+
+    def __init__(self, f):
+        self.f = f
+
+    def __call__(self, *args, **kwargs):
+        start = perf_counter()
+        result = self.f(*args, **kwargs)
+        return result, os.getpid(), perf_counter() - start
@@ -1,17 +1,26 @@
 
 
+from functools import partial
+
 from labelled_functions.labels import LabelledFunction
 
 
+def _values(*values):
+    return values
+
+
 def let(**kwargs):
     name = "let " + ", ".join((f"{name}={value}" for name, value in kwargs.items()))
-    return LabelledFunction(lambda: tuple(kwargs.values()), name=name, input_names=[], output_names=list(kwargs.keys()))
+    lf = LabelledFunction(partial(_values, *kwargs.values()), name=name, input_names=[], output_names=list(kwargs.keys()))
+    lf.pure = True
+    return lf
 
 
 def relabel(old, new):
     def identity(**kwargs):
         return {new: kwargs[old]}
     lf = LabelledFunction(identity, name=f"relabel {old} as {new}", input_names=[old], output_names=[new])
+    lf.pure = True
     return lf
 
 
@@ -0,0 +1,340 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""Hooks called around each call of a labelled function.
+
+>>> def on_call_end(span):
+...     print(span.name, span.duration)
+>>> with hooks(on_call_end=on_call_end):
+...     pipe(x=1.0)
+
+Each call is described by a `Span`. The calls made by a pipeline, and the
+calls made by a map (including in worker processes), are nested in the span
+of the pipeline or of the map. The spans of the worker processes are sent
+back with the results and the hooks are called for them in the main process.
+
+While no hook is registered, `AbstractLabelledCallable.__call__` is not
+instrumented and the hooks cost nothing.
+
+`chrome_trace` records the spans in the Chrome trace-event format, that can
+be opened in chrome://tracing or https://ui.perfetto.dev.
+"""
+
+import os
+import json
+from contextlib import contextmanager
+from threading import local, Lock, get_ident
+from time import perf_counter
+
+from .abstract import AbstractLabelledCallable
+
+
+# API
+
+class Span:
+    """A call of a labelled function, or a map.
+
+    Attributes
+    ----------
+    name: str
+        The name of the function.
+    input_names: List[str]
+        The names of the inputs of the function.
+    kind: str
+        'call' for the call of a labelled function, 'map' for a map.
+    parent: Span or None
+        The span in which this span is nested.
+    start, end: float
+        Times of the beginning and of the end of the call (from
+        `time.perf_counter`). `end` is None until the end of the call.
+    user_time: float
+        Time spent in the user's code: the time spent in the function of a
+        labelled function, or the sum of the user times of the nested calls
+        for the functions calling other labelled functions (e.g. pipelines).
+    error: Exception or None
+        The exception raised by the call, if any.
+    pid, thread_id: int
+        Process and thread in which the call has been made.
+    metrics: Dict[str, Any]
+        Measurements added by the hooks (e.g. by `profiling.profile`). They
+        are sent back from the worker processes with the spans.
+    """
+
+    __slots__ = ('name', 'input_names', 'kind', 'parent', 'start', 'end', 'user_time', 'error',
+                 'pid', 'thread_id', 'metrics', '_has_children', '_children_user_time', '_callable', '_result')
+
+    def __init__(self, name, input_names, kind, parent):
+        self.name = name
+        self.input_names = input_names
+        self.kind = kind
+        self.parent = parent
+        self.start = None
+        self.end = None
+        self.user_time = 0.0
+        self.error = None
+        self.pid = os.getpid()
+        self.thread_id = get_ident()
+        self.metrics = {}
+        self._has_children = False
+        self._children_user_time = 0.0
+        self._callable = None
+        self._result = None
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    @property
+    def outputs(self):
+        """The outputs of the call as a dict, only available in `on_call_end`."""
+        if self._callable is None:
+            return {}
+        return self._callable._output_as_dict(self._result)
+
+    @property
+    def depth(self):
+        depth, span = 0, self.parent
+        while span is not None:
+            depth, span = depth + 1, span.parent
+        return depth
+
+    @property
+    def root(self):
+        """The outermost span in which this span is nested."""
+        span = self
+        while span.parent is not None:
+            span = span.parent
+        return span
+
+    def __repr__(self):
+        return f"Span({self.kind} {self.name}, depth={self.depth})"
+
+
+def add_hooks(on_call_start=None, on_call_end=None, in_workers=False):
+    """Register functions called with the `Span` of each call at its start
+    and at its end. Returns a handle to be passed to `remove_hooks`.
+
+    With `in_workers`, the hooks are also sent to the worker processes of
+    the maps, to be called there before the spans are sent back (they must
+    be picklable, e.g. functions defined at the top level of a module).
+    """
+    handle = (on_call_start, on_call_end)
+    with _hooks_lock:
+        _hooks.append(handle)
+        if in_workers:
+            _worker_hooks.append(handle)
+        AbstractLabelledCallable.__call__ = _instrumented_call
+    return handle
+
+
+def remove_hooks(handle):
+    with _hooks_lock:
+        _hooks.remove(handle)
+        if handle in _worker_hooks:
+            _worker_hooks.remove(handle)
+        if len(_hooks) == 0:
+            AbstractLabelledCallable.__call__ = _original_call
+
+
+@contextmanager
+def hooks(on_call_start=None, on_call_end=None, in_workers=False):
+    """Register the hooks (see `add_hooks`) in this context."""
+    handle = add_hooks(on_call_start, on_call_end, in_workers)
+    try:
+        yield
+    finally:
+        remove_hooks(handle)
+
+
+class ChromeTrace:
+    """Spans recorded in the Chrome trace-event format (see `chrome_trace`)."""
+
+    def __init__(self):
+        self.events = []
+
+    def on_call_end(self, span):
+        self.events.append({
+            'name': span.name,
+            'cat': span.kind,
+            'ph': 'X',
+            'ts': span.start * 1e6,
+            'dur': span.duration * 1e6,
+            'pid': span.pid,
+            'tid': span.thread_id,
+            'args': {'inputs': list(span.input_names), **({'error': repr(span.error)} if span.error is not None else {})},
+        })
+
+    def to_dict(self):
+        return {'traceEvents': sorted(self.events, key=lambda e: e['ts']), 'displayTimeUnit': 'ms'}
+
+    def save(self, path):
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file)
+
+
+@contextmanager
+def chrome_trace(path=None):
+    """Record the spans of the calls made in this context in a `ChromeTrace`,
+    saved to `path` (if not None) at the end of the context."""
+    trace = ChromeTrace()
+    with hooks(on_call_end=trace.on_call_end):
+        yield trace
+    if path is not None:
+        trace.save(path)
+
+
+# INTERNALS
+
+_hooks = []
+_worker_hooks = []  # Hooks also registered in the worker processes
+_hooks_lock = Lock()
+_original_call = AbstractLabelledCallable.__call__
+_thread_state = local()
+
+
+def _is_active():
+    return len(_hooks) > 0
+
+
+def _stack():
+    try:
+        return _thread_state.stack
+    except AttributeError:
+        _thread_state.stack = []
+        return _thread_state.stack
+
+
+def _current_span():
+    stack = _stack()
+    return stack[-1] if len(stack) > 0 else None
+
+
+def _start(span, skipped_hooks=()):
+    for hooks in list(_hooks):
+        if hooks[0] is not None and hooks not in skipped_hooks:
+            hooks[0](span)
+
+
+def _end(span, skipped_hooks=()):
+    for hooks in list(_hooks):
+        if hooks[1] is not None and hooks not in skipped_hooks:
+            hooks[1](span)
+
+
+def _instrumented_call(self, *args, **kwargs):
+    """Replaces `AbstractLabelledCallable.__call__` while some hooks are registered."""
+    stack = _stack()
+    span = Span(self.name, self.input_names, 'call', stack[-1] if len(stack) > 0 else None)
+    stack.append(span)
+    span._callable = self
+    function_time = 0.0
+    span.start = perf_counter()
+    _start(span)
+    try:
+        args, kwargs = self._preprocess_inputs(args, kwargs)
+        function_start = perf_counter()
+        result = self.function(*args, **kwargs)
+        function_time = perf_counter() - function_start
+        span._result = self._postprocess_outputs(result)
+        return span._result
+    except Exception as e:
+        span.error = e
+        raise
+    finally:
+        span.end = perf_counter()
+        stack.pop()
+        span.user_time = span._children_user_time if span._has_children else function_time
+        if span.parent is not None:
+            span.parent._has_children = True
+            span.parent._children_user_time += span.user_time
+        if span.error is not None:
+            span._callable = None
+        _end(span)
+        span._callable = span._result = None
+
+
+@contextmanager
+def _span(name, input_names=(), kind='map'):
+    """Nest the calls made in this context in a span (e.g. for a map)."""
+    if not _is_active():
+        yield
+        return
+    stack = _stack()
+    span = Span(name, list(input_names), kind, stack[-1] if len(stack) > 0 else None)
+    stack.append(span)
+    span.start = perf_counter()
+    _start(span)
+    try:
+        yield
+    finally:
+        span.end = perf_counter()
+        stack.pop()
+        span.user_time = span._children_user_time
+        _end(span)
+
+
+class _TracedTask:
+    """Wraps a function sent to a worker process, such that the spans of its
+    calls are recorded in the worker and returned with its result.
+
+    When the task runs in the process that created it (e.g. with the threading
+    backend of joblib), the hooks are already installed: the calls are only
+    nested in the current span of the creator."""
+
+    def __init__(self, f, worker_hooks=(), parent_pid=None):
+        self.f = f
+        self.worker_hooks = list(worker_hooks)
+        self.parent_pid = os.getpid() if parent_pid is None else parent_pid
+        self.parent = _current_span()  # Not sent to other processes.
+
+    def __reduce__(self):
+        return _TracedTask, (self.f, self.worker_hooks, self.parent_pid)
+
+    def __call__(self, *args, **kwargs):
+        if os.getpid() == self.parent_pid:
+            return self._call_in_parent_process(*args, **kwargs)
+        placeholder = Span("", (), 'task', None)  # Replaced by the parent span in the main process.
+        events = []
+        stack = _stack()
+        stack.append(placeholder)
+        handles = [add_hooks(*hooks) for hooks in self.worker_hooks]
+        handles.append(add_hooks(lambda span: events.append(('start', span)), lambda span: events.append(('end', span))))
+        try:
+            result = self.f(*args, **kwargs)
+        finally:
+            for handle in handles:
+                remove_hooks(handle)
+            stack.pop()
+        return result, placeholder, events
+
+    def _call_in_parent_process(self, *args, **kwargs):
+        stack = _stack()
+        nested = self.parent is not None and (len(stack) == 0 or stack[-1] is not self.parent)
+        if nested:
+            stack.append(self.parent)
+        try:
+            result = self.f(*args, **kwargs)
+        finally:
+            if nested:
+                stack.pop()
+        return result, None, []
+
+
+def _replay_worker_events(results):
+    """Call the hooks for the spans returned by `_TracedTask`s, nested in the
+    current span, and return the results of the tasks."""
+    parent = _current_span()
+    skipped_hooks = list(_worker_hooks)  # They have already been called in the workers.
+    outputs = []
+    for result, placeholder, events in results:
+        for event, span in events:
+            if span.parent is placeholder:
+                span.parent = parent
+                if parent is not None and event == 'end':
+                    parent._has_children = True
+                    parent._children_user_time += span.user_time
+            if event == 'start':
+                _start(span, skipped_hooks)
+            else:
+                _end(span, skipped_hooks)
+        outputs.append(result)
+    return outputs
@@ -21,7 +21,7 @@ setup(
         'xarray',
         'toolz',
         'parso',
-        'joblib',
+        'joblib>=1.3',
         'tqdm',
     ],
 )
@@ -43,3 +43,35 @@ def all_kinds_of_args(x, y=1, *, z, t=3):
 #
 # def annotated_cube(x) -> ('length', 'area', 'volume'):
 #     return (12*x, 6*x**2, x**3)
+
+from labelled_functions.labels import label
+
+@label
+def labelled_cube(x):
+    cube = x**3
+    return cube
+
+@label
+def labelled_pair(x):
+    return x + 1, x + 2
+
+# A two-stage pipeline, whose first stage records its calls
+doubled_values = []
+
+def record_and_double(a):
+    doubled_values.append(a)
+    b = 2*a
+    return b
+
+def add_with_offset(b, c, d=1):
+    e = b + c + d
+    return e
+
+# A decorator of pipelines, recording its calls
+decorated_calls = []
+
+def times_100(function):
+    def decorated(**kwargs):
+        decorated_calls.append(kwargs)
+        return {name: 100*value for name, value in function(**kwargs).items()}
+    return decorated
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import pytest
+
+import numpy as np
+import pandas as pd
+
+from labelled_functions import label, pipeline
+from labelled_functions.maps import pandas_cartesian_product
+from labelled_functions.adaptive import adaptive_cartesian_product
+
+from example_functions import *
+
+
+def step(x, y):
+    z = 1.0 if x + y > 0.7 else 0.0
+    return z
+
+
+def test_flat_outputs_are_not_refined():
+    grid = dict(x=[0.0, 0.5, 1.0], y=[1.0, 2.0])
+    data = adaptive_cartesian_product(add, **grid, tolerance=10.0)
+    pd.testing.assert_frame_equal(data, pandas_cartesian_product(add, **grid).sort_index())
+
+
+def test_refinement_around_a_discontinuity():
+    data = adaptive_cartesian_product(step, x=[0.0, 0.5, 1.0], y=[0.0, 0.5, 1.0], tolerance=0.5, max_iterations=4)
+    assert data.index.names == ['x', 'y']
+    assert data.index.is_unique
+
+    # Refined down to cells of width 1/32 around the line x + y = 0.7
+    points = data.reset_index()
+    assert (np.isclose(points['x'] % (1/32), 0.0) | np.isclose(points['x'] % (1/32), 1/32)).all()
+    assert ((points['x'] - 1/32 > 0) & (points['x'] < 0.2)).any()
+    # ... but much less points than the full grid of the same resolution
+    assert len(data) < 33*33 / 3
+    # Far from the line, the grid is not refined
+    far = points[(points['x'] + points['y'] - 0.7).abs() > 0.6]
+    assert set(far['x']) <= {0.0, 0.5, 1.0}
+
+    for (x, y), z in data['z'].items():
+        assert z == step(x, y)
+
+
+def test_budget_and_tolerance_per_output():
+    pipe = pipeline([step, double])  # double of x, refined only along the discontinuity of z
+    data = adaptive_cartesian_product(pipe, x=[0.0, 1.0], y=[0.0, 1.0], tolerance={'z': 0.5}, max_evaluations=20, max_iterations=10)
+    assert 4 < len(data) <= 4 + 20
+    assert set(data.columns) == {'z', '2*x'}
+
+
+def test_parallel_batches():
+    serial = adaptive_cartesian_product(step, x=[0.0, 1.0], y=[0.0, 1.0], tolerance=0.5, max_iterations=3)
+    parallel = adaptive_cartesian_product(step, x=[0.0, 1.0], y=[0.0, 1.0], tolerance=0.5, max_iterations=3, n_jobs=2)
+    pd.testing.assert_frame_equal(serial, parallel)
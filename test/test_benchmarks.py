@@ -0,0 +1,31 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import sys
+import json
+import subprocess
+
+
+def test_benchmarks_run(tmp_path):
+    root = os.path.join(os.path.dirname(__file__), "..")
+
+    def run_benchmarks(*args):
+        return subprocess.run([sys.executable, "-m", "benchmarks", "--quick", "--filter", "label_construction", *args],
+                              cwd=root, capture_output=True, text=True)
+
+    output = run_benchmarks("--output", str(tmp_path / "baseline.json"))
+    assert output.returncode == 0, output.stderr
+    with open(tmp_path / "baseline.json") as f:
+        baseline = json.load(f)
+    assert {r['benchmark'] for r in baseline['results']} == {'calls.label_construction'}
+    assert all(r['seconds'] > 0 for r in baseline['results'])
+
+    # Comparison with a baseline that was much faster
+    for r in baseline['results']:
+        r['seconds'] /= 1000
+    with open(tmp_path / "baseline.json", 'w') as f:
+        json.dump(baseline, f)
+    output = run_benchmarks("--compare", str(tmp_path / "baseline.json"))
+    assert output.returncode == 1
+    assert len(json.loads(output.stdout)['regressions']) == len(baseline['results'])
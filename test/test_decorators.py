@@ -57,5 +57,95 @@ def test_progress_bar(capfd):
 
     pandas_map(wait, dt=[0.01]*10, progress_bar=True, n_jobs=2)
     out, err = capfd.readouterr()
-    assert "Done" in err
+    assert "10/10" in err
 
+    counted_wait = with_progress_bar(label(wait), total=2)
+    counted_wait(dt=0.0)
+    counted_wait(dt=0.0)
+    assert counted_wait.bar.n == 2
+    counted_wait.bar.close()
+
+
+
+def test_memoize(tmp_path):
+    from labelled_functions.decorators import memoize
+    from labelled_functions.memoization import Memoizer
+
+    calls = []
+    def slow_double(x):
+        calls.append(x)
+        sleep(0.01)
+        y = 2*x
+        return y
+
+    f = memoize(slow_double, max_entries=2)
+    assert f.input_names == ['x'] and f.output_names == ['y']
+    assert [f(1), f(2), f(1), f(x=2)] == [2, 4, 2, 4]
+    assert calls == [1, 2]
+    stats = f.function.cache.stats
+    assert (stats.hits, stats.misses, stats.evictions) == (2, 2, 0)
+    assert stats.time_saved >= 0.02
+
+    f(3)  # Evicts 1, the least recently used
+    assert stats.evictions == 1
+    f(2)
+    f(1)
+    assert calls == [1, 2, 3, 1]
+
+    # Disk tier, shared between two memoizers
+    f = memoize(slow_double, max_entries=1, directory=str(tmp_path))
+    g = memoize(slow_double, Memoizer(directory=str(tmp_path)))
+    calls.clear()
+    f(1), f(2), f(1), g(2)
+    assert calls == [1, 2]
+    assert f.function.cache.stats.disk_hits == 1
+    assert g.function.cache.stats.disk_hits == 1
+
+    # Different functions do not share results
+    h = memoize(label(slow_double).fix(x=5), Memoizer(directory=str(tmp_path)))
+    assert h() == 10
+
+    # Size bound on disk
+    big = memoize(lambda n: np.zeros(n), directory=str(tmp_path / "big"), max_disk_bytes=20_000)
+    for n in range(1000, 1010):
+        big(n)
+    assert big.function.cache.stats.disk_evictions > 0
+    assert sum(p.stat().st_size for p in (tmp_path / "big").iterdir()) <= 20_000
+
+    # Size bound in memory
+    big = memoize(lambda n: np.zeros(n), max_bytes=20_000)
+    for n in range(1000, 1010):
+        big(n)
+    assert big.function.cache._total_bytes <= 20_000
+    assert big.function.cache.stats.memory_evictions == 8
+
+
+def test_memoize_coalesces_calls_from_several_processes(tmp_path):
+    from labelled_functions.decorators import memoize
+    log = tmp_path / "log"
+
+    def slow_mesh(resolution):
+        with open(log, 'a') as f:
+            f.write(f"{resolution}\n")
+        sleep(0.3)
+        mesh = list(range(resolution))
+        return mesh
+
+    f = memoize(slow_mesh, directory=str(tmp_path / "cache"))
+    data = pandas_map(f, resolution=[10]*8 + [20]*8, n_jobs=4)
+    assert sorted(log.read_text().split()) == ['10', '20']
+    assert list(data['mesh'].map(len)) == [10]*8 + [20]*8
+
+
+def test_memoize_pipeline_in_cartesian_product():
+    from labelled_functions.decorators import memoize
+    from labelled_functions.maps import pandas_cartesian_product
+
+    f = memoize(pipeline([double, add]))
+    first = pandas_cartesian_product(f, x=[1, 2], y=[0, 1])
+    stats = f.function.cache.stats
+    assert (stats.hits, stats.misses) == (0, 4)
+
+    second = pandas_cartesian_product(f, x=[1, 2], y=[0, 1])
+    assert (stats.hits, stats.misses) == (4, 4)
+    assert first.equals(second)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import pytest
+from itertools import product
+
+import pandas as pd
+
+from labelled_functions.maps import pandas_map
+from labelled_functions.doe import (
+    from_sequence, zip_plans, product_of_plans, cross_plans, merge_shards, as_plan,
+)
+
+from example_functions import *
+
+
+def test_plans_have_the_same_experiments_as_before():
+    assert list(from_sequence(a=range(3), b=['foo'])) == [{'a': 0}, {'a': 1}, {'a': 2}, {'b': 'foo'}]
+    assert list(zip_plans(a=range(2), b=['foo', 'bar', 'baz'])) == [{'a': 0, 'b': 'foo'}, {'a': 1, 'b': 'bar'}]
+    assert list(product_of_plans(zip_plans(a=range(2), b='xy'), c=[True, False])) == [
+        {'a': 0, 'b': 'x', 'c': True}, {'a': 0, 'b': 'x', 'c': False},
+        {'a': 1, 'b': 'y', 'c': True}, {'a': 1, 'b': 'y', 'c': False},
+    ]
+    assert list(cross_plans(zip_plans(a=range(3)), b=['foo', 'bar'], pivot={'a': 1, 'b': 'bar'})) == [
+        {'a': 1, 'b': 'bar'}, {'a': 0, 'b': 'bar'}, {'a': 2, 'b': 'bar'}, {'a': 1, 'b': 'foo'},
+    ]
+    # Iterables of experiments can be used as plans
+    assert list(zip_plans(({'a': i} for i in range(2)), b='xy')) == [{'a': 0, 'b': 'x'}, {'a': 1, 'b': 'y'}]
+
+
+def test_random_access():
+    plan = product_of_plans(a=range(1000), b=range(1000), c=['x', 'y'])
+    assert len(plan) == 2_000_000
+    assert plan[0] == {'a': 0, 'b': 0, 'c': 'x'}
+    assert plan[2*(123*1000 + 456) + 1] == {'a': 123, 'b': 456, 'c': 'y'}
+    assert plan[-1] == {'a': 999, 'b': 999, 'c': 'y'}
+    with pytest.raises(IndexError):
+        plan[len(plan)]
+
+    small = product_of_plans(zip_plans(a=range(3), b='xyz'), c=range(4))
+    assert [small[i] for i in range(len(small))] == list(small)
+    assert list(small[2:7]) == list(small)[2:7]
+    assert list(small[::-3]) == list(small)[::-3]
+    assert len(product_of_plans()) == 0
+
+
+def test_iterators_are_read_lazily():
+    from itertools import count, islice
+
+    plan = zip_plans(i=count(), x=[0.1, 0.2, 0.3])
+    assert len(plan) == 3
+    assert plan[-1] == {'i': 2, 'x': 0.3}
+    assert list(plan.to_columns()['i']) == [0, 1, 2]
+    assert list(islice(zip_plans(i=count(), j=count(10)), 2)) == [{'i': 0, 'j': 10}, {'i': 1, 'j': 11}]
+    assert list(islice(from_sequence(a=count()), 2)) == [{'a': 0}, {'a': 1}]
+    assert list(islice(cross_plans(a=count(), pivot={'a': 1}), 3)) == [{'a': 1}, {'a': 0}, {'a': 2}]
+
+    # The experiments of the cross plans that differ from the pivot are only
+    # looked for in the plans where they are needed.
+    read = []
+    def experiments(name, n):
+        for i in range(n):
+            read.append((name, i))
+            yield {name: i}
+
+    plan = cross_plans(experiments('a', 3), experiments('b', 1000), pivot={'a': 1, 'b': 0})
+    assert read == []
+    assert plan[2] == {'a': 2, 'b': 0}
+    assert len(read) == 3
+    assert len(plan) == 1 + 2 + 999
+
+
+def test_incomplete_plans_can_not_be_created():
+    from labelled_functions.doe import Plan
+
+    class IncompletePlan(Plan):
+        def __len__(self):
+            return 1
+
+    with pytest.raises(TypeError):
+        IncompletePlan()
+
+
+def test_shards():
+    plan = product_of_plans(a=range(7), b=range(3))
+    shards = [plan.shard(k, 4) for k in range(4)]
+    assert [len(s) for s in shards] == [5, 5, 5, 6]
+    assert [e for s in shards for e in s] == list(plan)
+    assert list(plan.shard(1, 4)) == list(plan)[5:10]
+    with pytest.raises(ValueError):
+        plan.shard(4, 4)
+
+    results = {k: pandas_map(add, pd.DataFrame(list(plan.shard(k, 4))).rename(columns={'a': 'x', 'b': 'y'})) for k in range(4)}
+    merged = merge_shards({k: results[k] for k in reversed(range(4))})
+    assert list(merged.index) == [(e['a'], e['b']) for e in plan]
+
+
+def test_columns():
+    import numpy as np
+    plans = [
+        product_of_plans(zip_plans(a=range(3), b=['x', 'y', 'z']), c=[0.5, 1.5]),
+        from_sequence(a=range(3), b=['foo']),
+        cross_plans(zip_plans(a=range(3)), b=['foo', 'bar'], pivot={'a': 1, 'b': 'bar'}),
+        zip_plans(({'a': i} for i in range(2)), b='xy'),
+        product_of_plans(a=range(7), b=range(3)).shard(2, 3),
+        product_of_plans(a=range(2), b=[(1, 2), (3, 4)]),
+    ]
+    for plan in plans:
+        columns = plan.to_columns()
+        assert all(isinstance(column, np.ndarray) for column in columns.values())
+        pd.testing.assert_frame_equal(plan.to_dataframe(), pd.DataFrame(list(plan)), check_dtype=False)
+
+    columns = product_of_plans(a=range(1000), b=range(1000)).to_columns()
+    assert columns['a'].dtype == np.int64 and len(columns['a']) == 1_000_000
+    assert columns['a'][123456] == 123 and columns['b'][123456] == 456
+
+
+def test_map_of_a_plan():
+    plan = product_of_plans(x=range(3), y=[10, 20])
+    expected = pandas_map(add, pd.DataFrame(list(plan)))
+    pd.testing.assert_frame_equal(pandas_map(add, plan), expected)
+    pd.testing.assert_frame_equal(pandas_map(add, plan, columnar=True), expected, check_dtype=False)
+
+
+def test_space_filling_designs():
+    import numpy as np
+    from labelled_functions.doe import latin_hypercube, halton, sobol
+
+    plan = latin_hypercube(10, seed=0, x=(0.0, 1.0), y=(-5.0, 5.0))
+    assert len(plan) == 10
+    columns = plan.to_columns()
+    # Exactly one point in each tenth of the range of each input
+    assert sorted(np.floor(columns['x'] * 10).astype(int)) == list(range(10))
+    assert sorted(np.floor((columns['y'] + 5.0)).astype(int)) == list(range(10))
+    assert list(latin_hypercube(10, seed=0, x=(0.0, 1.0), y=(-5.0, 5.0))) == list(plan)
+
+    plan = halton(4, x=(0.0, 1.0), y=(0.0, 9.0))
+    assert np.allclose(plan.to_columns()['x'], [1/2, 1/4, 3/4, 1/8])
+    assert np.allclose(plan.to_columns()['y'], [3, 6, 1, 4])
+    assert np.allclose(halton(2, skip=2, x=(0.0, 1.0)).to_columns()['x'], [3/4, 1/8])
+
+    # Designs are plans like the others
+    assert len(product_of_plans(halton(8, x=(0.0, 1.0)), z=['a', 'b'])) == 16
+
+    pytest.importorskip("scipy")
+    plan = sobol(16, seed=0, x=(0.0, 1.0), y=(2.0, 3.0))
+    assert len(plan) == 16
+    assert sorted(np.floor(plan.to_columns()['x'] * 16).astype(int)) == list(range(16))
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import subprocess
+import pytest
+
+import numpy as np
+import pandas as pd
+
+from labelled_functions.labels import label
+from labelled_functions.pipeline import pipeline
+from labelled_functions.special_functions import let
+from labelled_functions.hashing import fingerprint
+
+from example_functions import *
+
+
+def test_fingerprint_of_values():
+    assert fingerprint(1) == fingerprint(1)
+    assert fingerprint(1) != fingerprint(1.0)
+    assert fingerprint("1") != fingerprint(1)
+    assert fingerprint([1, 2]) != fingerprint((1, 2))
+    assert fingerprint({'a': 1, 'b': 2}) == fingerprint({'b': 2, 'a': 1})
+    assert fingerprint({'a': 1, 'b': 2}) != fingerprint({'a': 2, 'b': 1})
+
+    a = np.linspace(0, 1, 1000)
+    assert fingerprint(a) == fingerprint(a.copy())
+    assert fingerprint(a) != fingerprint(a.astype(np.float32))
+    assert fingerprint(a) != fingerprint(a.reshape(10, 100))
+    assert fingerprint(a[::2]) == fingerprint(a[::2].copy())
+    b = a.copy()
+    b[500] += 1e-12
+    assert fingerprint(a) != fingerprint(b)
+
+    df = pd.DataFrame({'x': a, 'y': 2*a})
+    assert fingerprint(df) == fingerprint(df.copy())
+    assert fingerprint(df) != fingerprint(df.rename(columns={'y': 'z'}))
+    assert fingerprint(df) != fingerprint(df.set_index('x'))
+    assert fingerprint(df['x']) != fingerprint(df['y'])
+
+    with pytest.raises(TypeError):
+        fingerprint(x for x in [])
+
+
+def test_fingerprint_of_labelled_functions():
+    lf = label(cylinder_volume)
+    assert lf.fingerprint() == label(cylinder_volume).fingerprint()
+    assert lf.fingerprint() == lf.rename("other_name").fingerprint()
+    assert lf.fingerprint() != label(double).fingerprint()
+
+    # Fixed values and default values
+    assert lf.fix(length=1.0).fingerprint() == lf.fix(length=1.0).fingerprint()
+    assert lf.fix(length=1.0).fingerprint() != lf.fix(length=2.0).fingerprint()
+    assert lf.set_default(length=1.0).fingerprint() != lf.set_default(length=2.0).fingerprint()
+
+    # Markers
+    from labelled_functions.decorators import pure, vectorized
+    assert pure(cylinder_volume).fingerprint() == pure(cylinder_volume).fingerprint()
+    assert pure(cylinder_volume).fingerprint() != lf.fingerprint()
+    assert vectorized(cylinder_volume).fingerprint() != lf.fingerprint()
+
+    # Same code but different values in the closure
+    def make(factor):
+        def multiply(x):
+            y = factor * x
+            return y
+        return label(multiply)
+    assert make(2).fingerprint() == make(2).fingerprint()
+    assert make(2).fingerprint() != make(3).fingerprint()
+
+    # The digests of the code objects are kept in a bounded cache.
+    from labelled_functions.hashing import _code_digest
+    assert _code_digest.cache_info().hits > 0
+    assert _code_digest.cache_info().maxsize is not None
+
+    # Pipelines
+    pipe = pipeline([let(length=1.0), random_radius, cylinder_volume])
+    assert pipe.fingerprint() == pipeline([let(length=1.0), random_radius, cylinder_volume]).fingerprint()
+    assert pipe.fingerprint() != pipeline([let(length=2.0), random_radius, cylinder_volume]).fingerprint()
+    assert pipe.fingerprint() != pipeline([random_radius, let(length=1.0), cylinder_volume]).fingerprint()
+
+
+def test_fingerprint_is_the_same_in_another_process():
+    code = (
+        "from example_functions import *; "
+        "from labelled_functions import label, let, pipeline; "
+        "print(pipeline([let(length=1.0), random_radius, cylinder_volume]).fingerprint())"
+    )
+    test_dir = __file__.rsplit('/', 1)[0]
+    output = subprocess.run([sys.executable, "-c", code], cwd=test_dir, check=True,
+                            capture_output=True, text=True,
+                            env={'PYTHONPATH': f"{test_dir}/..:{test_dir}", 'PYTHONHASHSEED': 'random'})
+    assert output.stdout.strip() == pipeline([let(length=1.0), random_radius, cylinder_volume]).fingerprint()
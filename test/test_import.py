@@ -0,0 +1,19 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import sys
+import subprocess
+from pathlib import Path
+
+package_dir = str(Path(__file__).parent.parent)
+
+
+def run(code):
+    return subprocess.run([sys.executable, "-c", code],
+                          capture_output=True, text=True, check=True, cwd=package_dir)
+
+
+def test_heavy_modules_are_not_imported():
+    result = run("import sys, labelled_functions; "
+                 "print(*(m for m in ('numpy', 'pandas', 'xarray', 'tqdm', 'parso', 'toolz', 'joblib') if m in sys.modules))")
+    assert result.stdout.strip() == ""
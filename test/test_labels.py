@@ -118,3 +118,187 @@ def test_fix():
     assert llc(length=1.0) == np.pi
     assert keeping_inputs(llc)(length=1.0) == {'length': 1.0, 'volume': np.pi}
 
+
+
+def test_compiled_call():
+    from functools import partial
+    import pickle
+
+    la = LabelledFunction(optional_add)
+    assert la(1, 2) == la(1, y=2) == la(x=1, y=2) == 3
+    assert la() == 0
+    assert la._call is not None and la._call != la._generic_call
+
+    with pytest.raises(TypeError):
+        la(x=1, z=2)
+    with pytest.raises(TypeError):
+        la(1, 2, 3)
+
+    lb = la.set_default(x=10)
+    assert lb(y=1) == 11
+    assert la(y=1) == 1
+
+    # The default values can be edited in place after the first call.
+    le = LabelledFunction(optional_add)
+    assert le(x=1) == 1
+    le.default_values['y'] = 5
+    assert le(x=1) == 6
+    del le.default_values['y']
+    with pytest.raises(TypeError, match="'y'"):
+        le(x=1)
+    le.default_values['y'] = 2
+    assert le(1) == 3
+
+    lc = LabelledFunction(all_kinds_of_args)
+    with pytest.raises(TypeError):
+        lc(0, 1, 2)  # z is keyword-only
+    with pytest.raises(TypeError):
+        lc(x=0, y=1)
+
+    # Nested fix are merged in a single partial
+    lv = LabelledFunction(cube).fix(x=2)
+    assert lv() == cube(2)
+    lf = LabelledFunction(all_kinds_of_args).fix(x=0).fix(z=1)
+    assert isinstance(lf.function, partial) and not isinstance(lf.function.func, partial)
+    assert lf() is None
+
+    # The compiled function is not copied nor pickled
+    assert copy(la)._call is None
+    assert pickle.loads(pickle.dumps(la))(1, 2) == 3
+
+    # Input names that are not valid Python names
+    ld = LabelledFunction(lambda **kw: kw['2*x'], name="f", input_names=['2*x'], output_names=['y'])
+    assert ld(**{'2*x': 4}) == ld(**{'2*x': 4}) == 4
+    assert ld._call == ld._generic_call
+
+
+def test_output_names_parsing():
+    from labelled_functions.labels import _parse_output_names_with_ast, _parse_output_names_with_parso
+    sources = [
+        "def f(x):\n    return x\n",
+        "def f(x):\n    y = 2*x\n    return y\n",
+        "def f(x, y):\n    return x+y\n",
+        "def f(x, y):\n    return x + y\n",
+        "def f(x, y):\n    return (x*y)\n",
+        "def f(x):\n    return x.real, x.imag, x[0], g(x)\n",
+        "def f(x):\n    return a, \\\n        b\n",
+        "def f(x):\n    if x:\n        return a\n    def g():\n        return b\n",
+        "    def f(self, x):\n        y = 2*x + self.a\n        return y\n",
+        "def f(x):\n    return x,\n",
+        "def f(x):\n    print(x)\n",
+    ]
+    for source in sources:
+        assert _parse_output_names_with_ast(source) == _parse_output_names_with_parso(source)
+
+    # Handled by parso only
+    for source in ["def f(x):\n    return (a, b)\n", "def f(x):\n    return 42\n", "def f(x):\n    return x**2\n"]:
+        assert _parse_output_names_with_ast(source) is None
+
+
+def test_output_names_cache(monkeypatch):
+    import labelled_functions.labels
+    calls = []
+    def counting_getsource(f):
+        calls.append(f)
+        return getsource(f)
+    from inspect import getsource
+    monkeypatch.setattr(labelled_functions.labels, "getsource", counting_getsource)
+
+    def f(x):
+        unique_name_for_this_test = x
+        return unique_name_for_this_test
+
+    assert label(f).output_names == ['unique_name_for_this_test']
+    assert label(f).output_names == ['unique_name_for_this_test']
+    assert len(calls) == 1
+
+    # Wrappers sharing the same code are cached by the code of the wrapped function.
+    from functools import wraps
+
+    def logged(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            return function(*args, **kwargs)
+        return wrapper
+
+    def g(x):
+        other_name_for_this_test = x
+        return other_name_for_this_test
+
+    assert label(logged(f)).output_names == ['unique_name_for_this_test']
+    assert label(logged(g)).output_names == ['other_name_for_this_test']
+
+    # The cache is bounded.
+    from labelled_functions.labels import _output_names_of_code
+    assert _output_names_of_code.cache_info().maxsize is not None
+
+
+def test_pickling():
+    import pickle
+
+    # Labelled functions defined at the top level of a module are pickled by reference.
+    assert pickle.loads(pickle.dumps(labelled_cube)) is labelled_cube
+    assert len(pickle.dumps(labelled_cube)) < 150
+
+    lf = label(cylinder_volume).fix(length=2.0)
+    unpickled = pickle.loads(pickle.dumps(lf))
+    assert unpickled is not lf
+    assert unpickled.input_names == ['radius']
+    assert unpickled.output_names == ['volume']
+    assert unpickled(radius=1.0) == lf(radius=1.0)
+
+    # The placeholder for unknown outputs keeps its identity.
+    assert pickle.loads(pickle.dumps(Unknown)) is Unknown
+
+
+def test_wrapper_attributes():
+    def documented(x):
+        """Some documentation."""
+        y = x
+        return y
+
+    lf = label(documented)
+    assert lf.__doc__ == "Some documentation."
+    assert lf.__qualname__ == documented.__qualname__
+    assert lf.__name__ == "documented"
+    assert lf.__wrapped__ is documented
+    assert LabelledFunction.__doc__.startswith("A class wrapping a function")
+
+    # Other attributes can be set, as on functions.
+    lf.note = "checked"
+    assert lf.note == "checked"
+    with pytest.raises(AttributeError):
+        lf.missing_attribute
+
+
+def test_pickling_of_relabelled_global():
+    import pickle
+    from labelled_functions.maps import pandas_map
+    from labelled_functions.labels import _lookup_labelled_function
+
+    original_output_names = labelled_pair.output_names
+    label(labelled_pair, output_names=['a', 'b'])
+    try:
+        assert pickle.loads(pickle.dumps(labelled_pair)) is labelled_pair
+        # As unpickled in another process, where the function has its original labels
+        labels = (labelled_pair.name, ['x'], ['c', 'd'], {}, False, False)
+        copied = _lookup_labelled_function(labelled_pair.function.__module__, 'labelled_pair', labels)
+        assert copied is not labelled_pair
+        assert copied.output_names == ['c', 'd']
+        assert copied(x=1) == (2, 3)
+
+        df = pandas_map(labelled_pair, x=[1, 2, 3], n_jobs=2)
+        assert list(df.columns) == ['a', 'b']
+        assert list(df['b']) == [3, 4, 5]
+    finally:
+        label(labelled_pair, output_names=original_output_names)
+
+
+def test_copy_does_not_inspect_the_function(monkeypatch):
+    import labelled_functions.labels
+    lf = label(cylinder_volume)
+    monkeypatch.setattr(labelled_functions.labels, "_get_output_names", None)
+    copied = copy(lf)
+    assert copied is not lf
+    assert copied.output_names == lf.output_names
+    assert copied.output_names is not lf.output_names
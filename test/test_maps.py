@@ -7,7 +7,7 @@ import numpy as np
 import pandas as pd
 import xarray as xr
 
-from labelled_functions import label
+from labelled_functions import label, relabel
 from labelled_functions.maps import *
 
 from example_functions import *
@@ -93,3 +93,242 @@ def test_full_parametric_study():
     )
     assert A == full_parametric_study(add, A).to_xarray()
 
+
+
+def test_cartesian_product_of_pipeline():
+    from labelled_functions import pipeline
+    from labelled_functions.decorators import pure
+    doubled_values.clear()
+    pipe = pipeline([pure(record_and_double), add_with_offset], return_intermediate_outputs=True)
+    df = pandas_cartesian_product(pipe, a=[1, 2, 3], c=[10, 20, 30, 40])
+    assert len(doubled_values) == 3
+
+    expected = pandas_cartesian_product(keeping_inputs(pipe).rename("not a pipeline"), a=[1, 2, 3], c=[10, 20, 30, 40])
+    assert len(doubled_values) == 3 + 12
+    assert set(df.index.names) == {'a', 'c', 'd'}
+    assert np.all(df == expected[df.columns])
+
+    # The functions that are not marked as pure are evaluated for each combination.
+    doubled_values.clear()
+    pipe = pipeline([record_and_double, add_with_offset], return_intermediate_outputs=True)
+    assert np.all(pandas_cartesian_product(pipe, a=[1, 2, 3], c=[10, 20, 30, 40]) == df)
+    assert len(doubled_values) == 12
+
+    pipe = pipeline([random_radius, cylinder_volume], return_intermediate_outputs=True)
+    df = pandas_cartesian_product(pipe, length=[1.0, 2.0, 3.0])
+    assert df['radius'].nunique() == 3
+
+
+def test_cartesian_product_of_decorated_pipeline():
+    from labelled_functions import pipeline
+    from labelled_functions.decorators import decorate
+    decorated_calls.clear()
+
+    pipe = decorate(pipeline([double, add]), times_100)
+    df = pandas_cartesian_product(pipe, x=[1, 2], y=[0, 1])
+    assert len(decorated_calls) == 4
+    assert list(df['x+y']) == [100, 200, 200, 300]
+    assert list(df['2*x']) == [200, 200, 400, 400]
+
+
+def test_cartesian_product_with_constraints():
+    from labelled_functions import pipeline
+    checked, computed = [], []
+
+    def valid_radius(radius, length):
+        checked.append((radius, length))
+        return radius <= length
+
+    def volume(radius, length, height):
+        computed.append((radius, length, height))
+        return cylinder_volume(radius, length*height)
+
+    grid = dict(radius=[1, 2, 3], length=[2, 3], height=[10, 20, 30, 40])
+    df = pandas_cartesian_product(volume, **grid, where=valid_radius)
+    expected = pandas_cartesian_product(volume, **grid)
+    expected = expected[[r <= l for r, l, _ in expected.index]]
+    assert np.all(df == expected)
+    # The predicate is checked once for each (radius, length), before enumerating the heights
+    assert len(checked) == 6
+    assert len(computed) == 5*4 + 6*4
+
+    # In the hoisted evaluation of a pipeline
+    from labelled_functions.decorators import pure
+    doubled_values.clear()
+    pipe = pipeline([pure(record_and_double), add_with_offset], return_intermediate_outputs=True)
+    df = pandas_cartesian_product(pipe, a=[1, 2, 3], c=[10, 20, 30], where=[label(lambda a, c: a*10 != c), label(lambda a: a > 1)])
+    assert sorted(doubled_values) == [2, 3]
+    assert list(df.index) == [(2, 10, 1), (2, 30, 1), (3, 10, 1), (3, 20, 1)]
+    assert list(df['e']) == [15, 35, 17, 27]
+
+    # Predicates on the default values and without valid combination
+    assert len(pandas_cartesian_product(pipe, a=[1, 2], c=[10], where=lambda d: d > 1)) == 0
+    assert len(pandas_cartesian_product(add, x=[1, 2], y=[3], where=lambda x: x > 5)) == 0
+
+
+def square_root(a, guess=1.0):
+    """Newton iterations, counted in the outputs."""
+    root, iterations = guess, 0
+    while abs(root**2 - a) > 1e-10:
+        root, iterations = (root + a/root)/2, iterations + 1
+    return root, iterations
+
+
+@pytest.mark.parametrize("sweep_order", ['snake', 'hilbert'])
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_warm_started_cartesian_product(sweep_order, n_jobs):
+    grid = dict(a=np.linspace(100, 200, 16))
+    cold = pandas_cartesian_product(square_root, **grid)
+    warm = pandas_cartesian_product(square_root, **grid, warm_start={'guess': 'root'}, sweep_order=sweep_order, n_jobs=n_jobs)
+    assert warm.index.names == ['a']
+    assert list(warm.columns) == ['root', 'iterations']
+    assert list(warm.index) == list(cold.index.get_level_values('a'))
+    assert np.allclose(warm['root'], cold['root'])
+    assert warm['iterations'].sum() < cold['iterations'].sum() / 2
+
+
+def test_sweep_orders():
+    from labelled_functions.maps import _sweep_key
+    from itertools import product
+    sizes = (4, 3, 2)
+    for sweep_order in ['snake', 'hilbert']:
+        path = sorted(product(*(range(n) for n in sizes)), key=lambda i: _sweep_key(sweep_order, i, sizes))
+        assert sorted(path) == list(product(*(range(n) for n in sizes)))
+        if sweep_order == 'snake':
+            assert all(sum(abs(a - b) for a, b in zip(p, q)) == 1 for p, q in zip(path, path[1:]))
+
+    sizes = (8, 8)
+    path = sorted(product(range(8), range(8)), key=lambda i: _sweep_key('hilbert', i, sizes))
+    assert all(sum(abs(a - b) for a, b in zip(p, q)) == 1 for p, q in zip(path, path[1:]))
+
+
+def test_warm_start_with_constraints_and_pipelines():
+    from labelled_functions import pipeline
+
+    def scale(b):
+        a = 100*b
+        return a
+
+    pipe = pipeline([scale, square_root])
+    df = pandas_cartesian_product(pipe, b=[1, 2, 3, 4], where=lambda b: b != 2, warm_start={'guess': 'root'})
+    assert list(df.index) == [1, 3, 4]
+    assert np.allclose(df['root'], np.sqrt([100, 300, 400]))
+
+    with pytest.raises(ValueError):
+        pandas_cartesian_product(square_root, a=[1, 2], warm_start={'guess': 'nothing'})
+    with pytest.raises(ValueError):
+        pandas_cartesian_product(square_root, a=[1, 2], guess=[1.0], warm_start={'guess': 'root'})
+
+
+def test_columnar_map():
+    from labelled_functions import pipeline
+    from labelled_functions.decorators import vectorized
+    doubled_values.clear()
+    a, c = np.random.rand(5), np.random.rand(5)
+    pipe = pipeline([vectorized(record_and_double), add_with_offset])
+    df = pandas_map(pipe, a=a, c=c, columnar=True)
+    assert len(doubled_values) == 1
+    assert np.all(df == pandas_map(pipe, a=a, c=c))
+    assert np.all(df == pandas_map(pipe, a=a, c=c, columnar=True, n_jobs=2))
+
+    df = pandas_map(cube, a, columnar=True)
+    assert np.allclose(df['volume'], a**3)
+
+    # The inputs are reported as given, even if a stage reassigns them.
+    def shift(x):
+        x = x + 100
+        return x
+
+    def square(x):
+        y = x**2
+        return y
+
+    df = pandas_map(pipeline([shift, square]), x=[1, 2], columnar=True)
+    assert list(df.index) == [1, 2]
+    assert list(df['y']) == [101**2, 102**2]
+    assert df.equals(pandas_map(pipeline([shift, square]), x=[1, 2]))
+
+    # A decorated pipeline is called as a whole.
+    from labelled_functions.decorators import decorate
+    decorated_calls.clear()
+
+    df = pandas_map(decorate(pipeline([record_and_double, add_with_offset]), times_100), a=a, c=c, columnar=True)
+    assert len(decorated_calls) == 5
+    assert np.allclose(df['e'], 100*(2*a + c + 1))
+
+
+def test_xarray_apply():
+    pytest.importorskip("dask")
+    from labelled_functions import pipeline, let
+    from labelled_functions.decorators import vectorized
+
+    ds = xr.Dataset({'radius': ('i', np.linspace(0, 1, 20)), 'length': ('j', np.linspace(0, 1, 10))})
+    out = xarray_apply(cylinder_volume, ds, chunks={'i': 5})
+    assert out['volume'].chunks == ((5, 5, 5, 5), (10,))
+    assert np.allclose(out['volume'], np.pi * ds['radius']**2 * ds['length'])
+
+    pipe = pipeline([relabel('length', 'x'), cube, let(radius=2.0), vectorized(cylinder_volume)])
+    out = xarray_apply(pipe, ds.drop_vars('radius'), chunks={'j': 5})
+    assert set(out.data_vars) == {'length', 'area', 'volume'}
+    assert np.allclose(out['volume'], np.pi * 4.0 * 12*ds['length'])
+    assert np.allclose(out['area'], 6 * ds['length']**2)
+
+    # A decorated pipeline is applied as a whole.
+    from labelled_functions.decorators import decorate
+
+    out = xarray_apply(decorate(pipeline([relabel('length', 'x'), cube]), times_100), ds, chunks={'j': 5})
+    assert np.allclose(out['volume'], 100 * ds['length']**3)
+
+
+def test_xarray_apply_with_string_outputs():
+    pytest.importorskip("dask")
+
+    def describe(x):
+        text = "x" * int(x) + f" = {x}"
+        return text
+
+    ds = xr.Dataset({'x': ('i', np.arange(6.0))})
+    expected = [describe(x) for x in ds['x'].values]
+    assert list(xarray_apply(describe, ds)['text'].values) == expected
+    out = xarray_apply(describe, ds, chunks={'i': 2})
+    assert out['text'].dtype == object
+    assert list(out['text'].values) == expected
+
+
+def weekday(day):
+    import datetime
+    weekday_name = datetime.date(2024, 1, day).strftime("%A")
+    letters = list(weekday_name)
+    return weekday_name, letters
+
+
+def test_arrow_backed_results():
+    pa = pytest.importorskip("pyarrow")
+    from labelled_functions.maps import _arrow_table
+
+    df = pandas_map(weekday, day=range(1, 8), dtype_backend='pyarrow')
+    assert isinstance(df['weekday_name'].dtype, pd.ArrowDtype)
+    assert df['weekday_name'].dtype.pyarrow_dtype == pa.string()
+    assert df['letters'].dtype.pyarrow_dtype == pa.list_(pa.string())
+    assert isinstance(df.index.dtype, pd.ArrowDtype)
+    assert list(df.loc[1, 'letters']) == list("Monday")
+    expected = pandas_map(weekday, day=range(1, 8))
+    assert list(df['weekday_name']) == list(expected['weekday_name'])
+
+    # The columns are handed to Arrow without copy
+    table = pa.Table.from_pandas(df)
+    assert table.column('weekday_name').chunks[0].buffers()[-1].address \
+        == df['weekday_name'].array._pa_array.chunks[0].buffers()[-1].address
+
+    # Chunks of records with different inferred types
+    table = _arrow_table([{'x': 1}] * 3 + [{'x': None}] * 2 + [{'x': 1.5}], chunk_size=2)
+    assert table.column('x').type == pa.float64()
+    assert table.column('x').num_chunks == 3
+
+    for data in [
+        pandas_cartesian_product(add, x=[1, 2], y=[3.0, 4.0], dtype_backend='pyarrow'),
+        pandas_map(add, x=[1, 2], y=[3.0, 4.0], columnar=True, dtype_backend='pyarrow'),
+        pandas_cartesian_product(add, x=[1, 2], y=[3.0], where=lambda x: x > 5, dtype_backend='pyarrow'),
+        pandas_map(add, x=[1, 2], y=[3.0, 4.0], n_jobs=2, dtype_backend='numpy_nullable'),
+    ]:
+        assert all(isinstance(dtype, pd.api.extensions.ExtensionDtype) for dtype in data.dtypes)
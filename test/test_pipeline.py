@@ -82,6 +82,19 @@ def test_default_variables():
     assert pipe()['volume'] == 1.0
     assert pipe(x=10.0)['volume'] == 1000.0
 
+    ### The default values of the later function take precedence...
+    def h(c=10):
+        d = c
+        return d
+
+    assert (pipeline([g], default_values={'c': 5}) | label(h)).default_values == {'c': 10}
+    assert (label(g).set_default(c=5) | label(h)).default_values == {'c': 10}
+    assert (pipeline([g], default_values={'c': 5}) | pipeline([h])).default_values == {'c': 10}
+
+    # ... except for the outputs of the former.
+    assert (pipeline([f], default_values={'a': 5}) | label(g)).default_values == {'a': 5, 'c': 3}
+    assert (label(f).set_default(a=5) | label(g).set_default(b=1)).default_values == {'a': 5, 'c': 3}
+
 
 def test_fix():
     a, b = 1, 2
@@ -147,3 +160,187 @@ def test_merge():
     pipe = pipeline([random_radius, cylinder_volume])
     lf = pipe.merge_graph()
     # lf.graph(backend='pygraphviz', rankdir='TB').draw('/home/matthieu/tempo/test.pdf', prog='dot')
+
+
+def test_constant_folding():
+    from labelled_functions.decorators import pure
+    calls = []
+
+    def f(x):
+        calls.append(x)
+        y = 2*x
+        return y
+
+    # Functions that are not marked as pure are not folded.
+    pipe = pipeline([let(x=1.0), f, cylinder_volume])
+    assert pipe._constants == {'x': 1.0}
+    assert len(calls) == 0
+
+    f = pure(f)
+    pipe = pipeline([let(x=1.0), f, cylinder_volume])
+    assert len(calls) == 1
+    assert pipe._constants == {'x': 1.0, 'y': 2.0}
+    assert pipe(radius=1.0, length=1.0) == {'y': 2.0, 'volume': np.pi}
+    assert pipe(radius=2.0, length=1.0) == {'y': 2.0, 'volume': 4*np.pi}
+    assert len(calls) == 1
+
+    pipe = pipeline([f, cylinder_volume])
+    assert len(calls) == 1
+    fixed_pipe = pipe.fix(x=3.0)
+    assert len(calls) == 2
+    assert fixed_pipe(radius=1.0, length=1.0)['volume'] == np.pi
+    assert fixed_pipe._constants == {'y': 6.0}
+    assert len(calls) == 2
+
+    # Not folded: the output would shadow an input of a previous function.
+    pipe = pipeline([relabel('x', 'z'), let(x=1.0), f])
+    assert pipe._constants == {}
+    assert pipe(x=3.0) == {'z': 3.0, 'y': 2.0}
+
+    # Not folded: the output would overwrite a constant read by a function of the plan.
+    pipe = pipeline([let(x=1.0), label(add), let(x=2.0), f])
+    assert pipe._constants == {'x': 1.0}
+    assert pipe(y=0.0) == {'x+y': 1.0, 'y': 4.0}
+
+
+def test_constant_folding_keeps_side_effects(capsys):
+    from labelled_functions.decorators import pure
+
+    pipe = let(x=1) | show('x')
+    assert capsys.readouterr().out == ""
+    pipe()
+    pipe()
+    assert capsys.readouterr().out == "{'x': 1}\n{'x': 1}\n"
+
+    # Mutable outputs are not folded, even for pure functions, since they
+    # would be shared by all the calls.
+    def mk(n):
+        items = [0]*n
+        return items
+
+    def push(items):
+        items.append(1)
+        total = sum(items) + len(items) - 2
+        return total
+
+    for make in [label(mk).fix(n=1), pure(mk).fix(n=1)]:
+        pipe = pipeline([make, push])
+        assert [pipe()['total'] for _ in range(3)] == [1, 1, 1]
+
+
+def test_common_subexpression_elimination():
+    from labelled_functions.decorators import pure
+    calls = []
+
+    def f(x, y=1):
+        calls.append(x)
+        z = x + y
+        return z
+
+    def g(z):
+        u = 2*z
+        return u
+
+    def h(z, u):
+        v = z + u
+        return v
+
+    lf = pure(f)
+    pipe = pipeline([lf, g]) | pipeline([lf, h])
+    assert len(pipe.funcs) == 4
+    assert len(pipe._plan) == 3
+    assert pipe(x=1) == {'v': 6}
+    assert len(calls) == 1
+
+    # Functions that are not marked as pure are always run.
+    pipe = pipeline([label(f), g]) | pipeline([label(f), h])
+    assert len(pipe._plan) == 4
+    pipe = pipeline([random_radius, relabel('radius', 'first_radius'), random_radius])
+    assert len(pipe._plan) == 3
+
+    # Same function, same fixed values
+    pipe = pipeline([lf.fix(y=2), g]) | pipeline([pure(f).fix(y=2), h])
+    assert len(pipe._plan) == 3
+
+    # Different fixed values
+    pipe = pipeline([lf.fix(y=2), g]) | pipeline([lf.fix(y=3), h])
+    assert len(pipe._plan) == 4
+    assert pipe(x=1) == {'v': 10}
+
+    # The output has been overwritten in between
+    pipe = pipeline([lf, g, relabel('u', 'z'), lf, h])
+    assert len(pipe._plan) == 5
+
+
+def test_incremental_building():
+    f = label(lambda x: x + 1, name="f", output_names=['x'])
+    g = label(lambda x: 2*x, name="g", output_names=['x'])
+
+    p = f | g
+    q = p | f
+    r = p | g
+    assert q._builder is p._builder
+    assert r._builder is not p._builder
+    assert p.funcs == [f, g] and q.funcs == [f, g, f] and r.funcs == [f, g, g]
+    assert p(x=1) == {'x': 4}
+    assert q(x=1) == {'x': 5}
+    assert r(x=1) == {'x': 8}
+    assert q.name == "f | g | f"
+    assert (p.rename("p") | g).name == "p | g"
+
+    long_pipe = f
+    for _ in range(500):
+        long_pipe = long_pipe | f
+    assert long_pipe(x=0) == {'x': 501}
+    assert long_pipe._graph()[0] == {'x'}
+
+    # The overwritten constant is not folded since it has been read before.
+    pipe = let(x=1) | label(add) | let(x=2) | label(add)
+    assert pipe(y=0) == {'x+y': 2}
+
+
+def test_stream():
+    from itertools import count, islice
+    pipe = pipeline([cube, relabel('area', 'x'), double])
+    records = [{'x': float(x)} for x in range(20)]
+    expected = [pipe(**r) for r in records]
+    assert list(pipe.stream(records)) == expected
+    assert list(pipe.stream(records, threaded=True, buffer_size=2)) == expected
+
+    # Lazy consumption of an infinite stream
+    infinite_records = ({'x': float(x)} for x in count())
+    assert list(islice(pipe.stream(infinite_records, threaded=True), 5)) == expected[:5]
+
+    # Errors are raised in the consumer
+    with pytest.raises(TypeError):
+        list(pipe.stream([{'x': 1.0}, {'y': 1.0}], threaded=True))
+    with pytest.raises(ZeroDivisionError):
+        list(pipeline([label(lambda x: 1/x, name="inv", output_names=['y'])]).stream([{'x': 0}], threaded=True))
+
+    # A decorated pipeline is called as a whole.
+    from labelled_functions.decorators import decorate
+
+    decorated = decorate(pipeline([cube, relabel('area', 'x'), double]), times_100)
+    assert list(decorated.stream(records, threaded=True)) == [decorated(**r) for r in records]
+    assert list(decorated.stream(records[2:3], threaded=True)) == [{k: 100*v for k, v in expected[2].items()}]
+
+
+def test_pickling():
+    import pickle
+    pipe = let(length=2.0) | label(random_radius) | label(cylinder_volume)
+    longer = pipe | label(double, output_names=['y']).fix(x=1.0)  # Shares the builder of pipe
+
+    unpickled = pickle.loads(pickle.dumps(pipe))
+    assert unpickled.input_names == pipe.input_names
+    assert unpickled.output_names == pipe.output_names
+    assert 'y' not in unpickled.output_names
+    assert len(unpickled.funcs) == 3
+    assert unpickled.input_names == []
+    assert set(unpickled().keys()) == {'volume'}
+
+    # Only the functions of the pipeline are pickled, not the rest of the shared builder.
+    assert len(pickle.dumps(pipe)) < len(pickle.dumps(longer))
+
+    # The unpickled pipeline can still be extended.
+    extended = unpickled | label(double, output_names=['y']).fix(x=1.0)
+    assert extended()['y'] == 2.0
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import pytest
+from time import sleep
+
+from labelled_functions import label, pipeline, let, profile, pandas_map, pandas_cartesian_product
+from labelled_functions.abstract import AbstractLabelledCallable
+
+from example_functions import *
+
+
+def slow_area(radius):
+    sleep(0.005)
+    area = radius**2
+    return area
+
+
+def test_profile_pipeline():
+    original_call = AbstractLabelledCallable.__call__
+    pipe = pipeline([let(length=2.0), cylinder_volume, slow_area], name="pipe")
+
+    with profile() as profiler:
+        assert AbstractLabelledCallable.__call__ is not original_call
+        pandas_map(pipe, radius=[1.0, 2.0, 3.0])
+        pipe(radius=1.0)
+    assert AbstractLabelledCallable.__call__ is original_call
+
+    report = profiler.report()
+    assert report.index.names == ['function', 'stage']
+    assert set(report.index) == {('pipe', 'pipe'), ('pipe', 'cylinder_volume'), ('pipe', 'slow_area')}
+    assert report.loc[('pipe', 'pipe'), 'count'] == 4
+    assert report.loc[('pipe', 'slow_area'), 'count'] == 4
+    assert report.index[0] == ('pipe', 'pipe')  # Sorted by total time
+    assert report.index[1] == ('pipe', 'slow_area')
+
+    slow = report.loc[('pipe', 'slow_area')]
+    assert slow['mean'] >= 0.005
+    assert slow['p50'] <= slow['p90'] <= slow['p99']
+    assert slow['user'] >= 0.02
+    assert 0.0 <= slow['overhead'] < slow['user']
+
+    # The user time of the pipeline is the user time of its stages.
+    whole = report.loc[('pipe', 'pipe')]
+    assert whole['user'] == pytest.approx(report.loc[('pipe', 'slow_area'), 'user'] + report.loc[('pipe', 'cylinder_volume'), 'user'])
+    assert whole['overhead'] > 0.0
+
+
+def test_profile_parallel_map():
+    pipe = pipeline([let(length=2.0), cylinder_volume, slow_area], name="pipe")
+    with profile() as profiler:
+        data = pandas_cartesian_product(pipe, radius=[1.0, 2.0, 3.0], n_jobs=2)
+        pandas_map(double, x=[1, 2], n_jobs=2)
+    assert len(data) == 3
+
+    report = profiler.report()
+    assert report.loc[('pipe', 'slow_area'), 'count'] == 3
+    assert report.loc[('double', 'double'), 'count'] == 2
+
+
+def make_big_arrays(n):
+    import numpy as np
+    temporary = np.ones((n, n))  # Not returned
+    big = np.zeros(n * n // 2)
+    return big
+
+
+def reduce_array(big):
+    total = float(big.sum())
+    return total
+
+
+def test_profile_memory():
+    import tracemalloc
+    pipe = pipeline([make_big_arrays, reduce_array], name="pipe")
+    with profile(memory=True) as profiler:
+        pandas_map(pipe, n=[200, 400])
+        pandas_map(pipe, n=[300], n_jobs=2)
+    assert not tracemalloc.is_tracing()
+
+    report = profiler.report()
+    assert report.loc[('pipe', 'make_big_arrays'), 'peak_memory'] >= 400*400*8
+    assert report.loc[('pipe', 'reduce_array'), 'peak_memory'] < 400*400*8
+    assert report.loc[('pipe', 'pipe'), 'peak_memory'] >= report.loc[('pipe', 'make_big_arrays'), 'peak_memory']
+
+    sizes = profiler.output_sizes()
+    assert sizes.index.names == ['function', 'stage', 'variable']
+    assert sizes.loc[('pipe', 'make_big_arrays', 'big'), 'max'] == 400*400//2*8
+    assert sizes.loc[('pipe', 'make_big_arrays', 'big'), 'mean'] == (200*200 + 400*400 + 300*300)//2*8/3
+    assert sizes.index[0] == ('pipe', 'make_big_arrays', 'big')
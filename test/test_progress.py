@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import pytest
+from time import sleep
+
+from labelled_functions import label, pipeline, let, pandas_map, pandas_cartesian_product
+from labelled_functions.progress import Progress
+
+from example_functions import *
+
+
+def wait(dt):
+    sleep(dt)
+    output = 1
+    return output
+
+
+def test_progress_callback():
+    snapshots = []
+    pandas_map(wait, dt=[0.01]*10, progress=snapshots.append)
+    last = snapshots[-1]
+    assert (last.completed, last.total, last.eta, last.queue_depth) == (10, 10, 0.0, 0)
+    assert last.rate > 0
+    assert list(last.utilization.keys()) == [os.getpid()]
+    assert 0.5 < last.utilization[os.getpid()] <= 1.0
+    assert all(s.completed <= s.total for s in snapshots)
+
+
+def test_progress_of_parallel_map():
+    progress = Progress(interval=0.0)
+    snapshots = []
+    progress.callbacks.append(snapshots.append)
+    pandas_map(wait, dt=[0.05]*8, n_jobs=2, progress=progress)
+
+    snapshot = progress.snapshot()
+    assert snapshot.completed == snapshot.total == 8
+    assert len(snapshot.utilization) == 2
+    assert os.getpid() not in snapshot.utilization
+    assert [s.completed for s in snapshots] == list(range(1, 9)) + [8]
+    assert any(s.eta is not None and s.eta > 0 for s in snapshots[:-1])
+
+
+def test_progress_of_other_maps():
+    from labelled_functions.decorators import pure
+    pipe = pipeline([let(length=2.0), pure(cylinder_volume), pure(label(double, output_names=['y']))])
+
+    progress = Progress()
+    pandas_cartesian_product(pipe, radius=[1.0, 2.0, 3.0], x=[1.0, 2.0], progress=progress)
+    assert progress.snapshot().completed == progress.snapshot().total == 3 + 2  # Hoisted evaluations
+
+    pandas_map(pipe, radius=[1.0, 2.0, 3.0], x=[1.0, 2.0, 3.0], columnar=True, progress=progress)
+    assert progress.snapshot().completed == progress.snapshot().total == 3*2
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json
+import pytest
+
+from labelled_functions import label, pipeline, let, pandas_map
+from labelled_functions.abstract import AbstractLabelledCallable
+from labelled_functions.tracing import hooks, add_hooks, remove_hooks, chrome_trace
+
+from example_functions import *
+
+
+def test_hooks():
+    original_call = AbstractLabelledCallable.__call__
+    pipe = pipeline([let(length=2.0), cylinder_volume, label(double, output_names=['y'])], name="pipe")
+    events = []
+    with hooks(on_call_start=lambda span: events.append(('start', span.name, span.depth)),
+               on_call_end=lambda span: events.append(('end', span.name, span.depth))):
+        pipe(radius=1.0, x=1.0)
+    assert AbstractLabelledCallable.__call__ is original_call
+    assert events == [
+        ('start', 'pipe', 0),
+        ('start', 'cylinder_volume', 1), ('end', 'cylinder_volume', 1),
+        ('start', 'double', 1), ('end', 'double', 1),
+        ('end', 'pipe', 0),
+    ]
+
+    spans = []
+    handle = add_hooks(on_call_end=spans.append)
+    with pytest.raises(TypeError):
+        pipe(radius=1.0)
+    remove_hooks(handle)
+    assert AbstractLabelledCallable.__call__ is original_call
+    assert spans[-1].name == 'pipe' and isinstance(spans[-1].error, TypeError)
+    assert spans[-1].input_names == ['radius', 'x']
+
+
+def test_hooks_in_worker_processes():
+    spans = []
+    with hooks(on_call_end=spans.append):
+        pandas_map(double, x=[1, 2, 3], n_jobs=2)
+    calls = [span for span in spans if span.kind == 'call']
+    maps = [span for span in spans if span.kind == 'map']
+    assert len(maps) == 1
+    assert len(calls) == 6  # keeping_inputs(double) and double for each input
+    assert all(span.root is maps[0] for span in calls)
+    assert all(maps[0].start <= span.start <= span.end <= maps[0].end for span in calls)
+
+
+def test_hooks_in_worker_threads():
+    from joblib import parallel_config
+    for in_workers in [False, True]:
+        spans = []
+        with parallel_config(backend='threading'), hooks(on_call_end=spans.append, in_workers=in_workers):
+            pandas_map(double, x=[1, 2, 3], n_jobs=2)
+        calls = [span for span in spans if span.kind == 'call']
+        maps = [span for span in spans if span.kind == 'map']
+        assert len(maps) == 1
+        assert len(calls) == 6  # Not counted again by the hooks of the tasks
+        assert all(span.root is maps[0] for span in calls)
+
+
+def test_chrome_trace(tmp_path):
+    pipe = pipeline([let(length=2.0), cylinder_volume], name="pipe")
+    with chrome_trace(tmp_path / "trace.json") as trace:
+        pandas_map(pipe, radius=[1.0, 2.0])
+    with open(tmp_path / "trace.json") as f:
+        data = json.load(f)
+    events = data['traceEvents']
+    assert [e['name'] for e in events][:3] == ['pipe', 'pipe', 'pipe']  # The map, keeping_inputs and the pipeline
+    assert sum(e['name'] == 'cylinder_volume' for e in events) == 2
+    assert all(e['ph'] == 'X' and e['dur'] >= 0 for e in events)
+    assert events[0]['cat'] == 'map'